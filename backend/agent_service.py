@@ -2,12 +2,30 @@
 LLM Agent with map control tools
 The model can query data AND control the map display
 """
-import json
+import asyncio
+import logging
 import os
-from typing import Any
-from groq import Groq
+import threading
+import orjson
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+import numpy as np
+from groq import AsyncGroq
 from service import MappingService
-from models.domain import Campaign
+from models.domain import Campaign, FeatureColumns, FEATURE_TYPES, FEATURE_CONDITIONS
+
+logger = logging.getLogger(__name__)
+
+# Category name -> int8 code used in the feature columns
+_TYPE_CODE = {name: code for code, name in enumerate(FEATURE_TYPES)}
+_CONDITION_CODE = {name: code for code, name in enumerate(FEATURE_CONDITIONS)}
+
+
+def _count_codes(codes: np.ndarray, names: tuple[str, ...]) -> dict[str, int]:
+    """Occurrences per category name, sorted by name, omitting absent categories"""
+    counts = np.bincount(codes, minlength=len(names)).tolist()
+    return {names[code]: counts[code] for code in sorted(range(len(names)), key=names.__getitem__) if counts[code]}
 
 
 # Tool definitions for the LLM
@@ -157,6 +175,18 @@ MAPPING_TOOLS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_campaign_summary",
+            "description": "Get campaign totals: number of features and image positions, with feature counts by type and condition",
+            "parameters": {
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -172,226 +202,548 @@ MAPPING_TOOLS = [
 ]
 
 
+# Static system prompt, kept free of per-campaign or per-turn data so the
+# prefix is byte-identical across calls and the provider's prompt cache can hit.
+# Campaign stats are pulled on demand through get_campaign_summary instead.
+SYSTEM_PROMPT = """You are a helpful assistant for a mobile mapping campaign in San Bernardino.
+
+Use the provided tools to answer user questions. Your text responses should be plain, natural language only.
+
+TOOL USAGE:
+- show_features: Show/find features on map
+- find_images_with_features: Find which images contain specific features
+- find_richest_image: Find image position with most features
+- query_images: Get total image count
+- get_campaign_summary: Get campaign totals and feature counts by type/condition
+
+HORIZONTAL FEATURES (on ground): pavement_damage, road_marking, manhole_cover, drainage_grate, pavement_patch
+VERTICAL FEATURES (above ground): traffic_sign, street_light, utility_pole, trash_bin, fire_hydrant, traffic_light, vegetation
+
+Conditions: good, fair, poor, damaged"""
+
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# History is a bounded deque of the last HISTORY_MAX_MESSAGES messages. Once it
+# grows past the threshold, older turns are folded into a running summary by a
+# small model (in the background, after the turn returns) and only the most
+# recent messages are kept verbatim
+SUMMARY_MODEL = "llama-3.1-8b-instant"
+HISTORY_MAX_MESSAGES = 10
+HISTORY_SUMMARY_THRESHOLD = 8
+HISTORY_KEEP_RECENT = 4
+
+# Identical questions in an identical context are answered from an LRU cache
+RESPONSE_CACHE_SIZE = 128
+
+
+def dumps_tool_uses(tool_uses: list[dict]) -> list[dict]:
+    """Tool uses for the HTTP response, reusing each result's pre-serialized JSON"""
+    return [
+        {"tool": t["tool"], "input": t["input"], "result": orjson.Fragment(t["_result_json"])}
+        for t in tool_uses
+    ]
+
+
+def dumps_response(response: dict) -> bytes:
+    """Serialize an ask() result without re-encoding the tool results"""
+    return orjson.dumps({**response, "tool_uses": dumps_tool_uses(response["tool_uses"])})
+
+
+@dataclass(slots=True, frozen=True)
+class _SharedState:
+    """A campaign and the agent lookup tables built from it, published as one object"""
+    campaign: Campaign
+    feature_ids: np.ndarray  # int64, sorted
+    feature_type_codes: np.ndarray  # int8, row-aligned with feature_ids
+    feature_condition_codes: np.ndarray  # int8, row-aligned with feature_ids
+    image_offsets: np.ndarray  # int64, CSR offsets per campaign image
+    image_feature_rows: np.ndarray  # int64 rows into feature_ids
+    image_rows: np.ndarray  # int64 owning image of each entry
+    
+    @classmethod
+    def build(cls, campaign: Campaign, columns: FeatureColumns) -> "_SharedState":
+        # The service's feature columns reordered by id; type/condition are int8
+        # codes, so a filter is one small-integer comparison over the column
+        order = np.argsort(columns.ids, kind="stable")
+        feature_ids = columns.ids[order]
+        
+        # Image -> visible features as a CSR pair: image i's entries are
+        # image_feature_rows[image_offsets[i]:image_offsets[i + 1]], stored as
+        # row indices into the feature columns above (not raw IDs) so a filter
+        # mask can be gathered directly, however sparse the ID range is.
+        # image_rows holds the owning image of every entry, so per-image match
+        # counts are a single np.bincount.
+        row_of = {fid: row for row, fid in enumerate(feature_ids.tolist())}
+        rows = [
+            np.array(sorted({row_of[fid] for fid in img.feature_ids if fid in row_of}), dtype=np.int64)
+            for img in campaign.images
+        ]
+        lengths = np.array([len(r) for r in rows], dtype=np.int64)
+        image_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=image_offsets[1:])
+        
+        return cls(
+            campaign=campaign,
+            feature_ids=feature_ids,
+            feature_type_codes=columns.type_codes[order],
+            feature_condition_codes=columns.condition_codes[order],
+            image_offsets=image_offsets,
+            image_feature_rows=np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+            image_rows=np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+        )
+
+
 class MappingAgent:
     """LLM agent that can query data and control the map"""
     
-    def __init__(self, api_key: str):
-        self.client = Groq(api_key=api_key)
-        self.campaign = MappingService.get_campaign()
-        self.conversation_history = []  # Maintain context between questions
+    # Campaign and derived lookup tables are immutable and shared by every
+    # agent (one per session). A reload publishes a new _SharedState with one
+    # reference swap; each agent picks it up at its next turn.
+    _shared: Optional["_SharedState"] = None
+    _shared_lock = threading.Lock()
     
-    def execute_tool(self, tool_name: str, tool_input: dict) -> dict:
-        """Execute a tool and return results + map commands"""
+    def __init__(self, api_key: str, client: Optional[AsyncGroq] = None):
+        # Pass a shared client when running many agents so they share one connection pool
+        self.client = client or AsyncGroq(api_key=api_key)
+        self._lock = asyncio.Lock()  # Serializes turns that share conversation state
+        self.conversation_history: deque[dict] = deque(maxlen=HISTORY_MAX_MESSAGES)  # Maintain context between questions
+        self._summary: Optional[str] = None  # Running summary of older turns
+        self._compaction: Optional[asyncio.Task] = None  # In-flight background summary, if any
+        self._slots: dict[str, Any] = {}  # Structured state written by tools
+        self._resp_cache: OrderedDict[tuple, dict] = OrderedDict()
+        self._dispatch: dict[str, Callable[[dict], dict]] = {
+            "show_features": self._tool_show_features,
+            "query_images": self._tool_query_images,
+            "get_campaign_summary": self._tool_get_campaign_summary,
+            "find_images_with_features": self._tool_find_images_with_features,
+            "find_richest_image": self._tool_find_richest_image,
+            "highlight_on_map": self._tool_highlight_on_map,
+            "show_statistics": self._tool_show_statistics,
+            "clear_map": self._tool_clear_map,
+        }
         
-        if tool_name == "show_features":
-            # Combined: query + highlight in one step
-            feature_type = tool_input.get("feature_type", "all")
-            condition = tool_input.get("condition", "any")
-            color = tool_input.get("color", "#FF0000")
-            
-            filtered = self.campaign.features
-            
-            if feature_type != "all":
-                filtered = [f for f in filtered if f.type == feature_type]
-            
-            if condition != "any":
-                filtered = [f for f in filtered if f.condition == condition]
+        self._state: Optional[_SharedState] = None
+        self._sync_state()
+        
+        self._clear_map_result = {
+            "map_command": {
+                "command": "clear_highlights"
+            },
+            "message": "Cleared all highlights from the map"
+        }
+    
+    @staticmethod
+    def _current_shared() -> "_SharedState":
+        shared = MappingAgent._shared
+        if shared is None:
+            with MappingAgent._shared_lock:
+                if MappingAgent._shared is None:
+                    MappingAgent._shared = _SharedState.build(*MappingService.get_campaign_and_feature_columns())
+                shared = MappingAgent._shared
+        return shared
+    
+    @staticmethod
+    def refresh_shared_state():
+        """Rebuild the shared state from the service's current campaign and publish it in one swap"""
+        with MappingAgent._shared_lock:
+            MappingAgent._shared = _SharedState.build(*MappingService.get_campaign_and_feature_columns())
+    
+    def _sync_state(self):
+        """Point this session at the latest shared state (at turn boundaries, so a turn sees one campaign)"""
+        shared = MappingAgent._current_shared()
+        if shared is self._state:
+            return
+        self._state = shared
+        # Answers cached against the previous data no longer apply; the conversation is kept
+        self._resp_cache.clear()
+        # Argument-free tools always return the same payload; build it once per state
+        image_count = len(shared.campaign.images)
+        self._query_images_result = {
+            "count": image_count,
+            "message": f"Campaign has {image_count} image positions (shown as blue camera dots on the map)"
+        }
+    
+    @property
+    def campaign(self) -> Campaign:
+        return self._state.campaign
+    
+    def _filter_mask(self, feature_type: str, condition: str) -> np.ndarray:
+        """Boolean mask over the feature columns ("all"/"any" match everything)"""
+        mask = np.ones(len(self._state.feature_ids), dtype=bool)
+        if feature_type not in ("all", "any"):
+            code = _TYPE_CODE.get(feature_type)
+            if code is None:
+                return np.zeros(len(self._state.feature_ids), dtype=bool)
+            mask &= self._state.feature_type_codes == code
+        if condition != "any":
+            code = _CONDITION_CODE.get(condition)
+            if code is None:
+                return np.zeros(len(self._state.feature_ids), dtype=bool)
+            mask &= self._state.feature_condition_codes == code
+        return mask
+    
+    def _image_match_counts(self, mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Per-image count of features selected by mask, plus the per-entry hits"""
+        entry_hits = mask[self._state.image_feature_rows]
+        counts = np.bincount(self._state.image_rows[entry_hits], minlength=len(self._state.image_offsets) - 1)
+        return counts, entry_hits
+    
+    def _update_slots(self, tool_name: str, tool_input: dict, result: dict):
+        """Record what the last tool call touched, for the memory preamble"""
+        self._slots["last_tool"] = tool_name
+        if "feature_type" in tool_input:
+            self._slots["last_feature_type"] = tool_input["feature_type"]
+        if "condition" in tool_input:
+            self._slots["last_condition"] = tool_input["condition"]
+        
+        map_command = result.get("map_command") or {}
+        if map_command.get("command") == "highlight_features":
+            self._slots["last_highlight_label"] = map_command.get("label")
+            self._slots["last_highlight_count"] = len(map_command["feature_ids"])
+        elif map_command.get("command") == "clear_highlights":
+            self._slots.pop("last_highlight_label", None)
+            self._slots.pop("last_highlight_count", None)
+        
+        if result.get("richest_image"):
+            self._slots["last_image_id"] = result["richest_image"]["image_id"]
+    
+    def _memory_message(self) -> Optional[dict]:
+        """Summary + slots preamble, placed after the static system prompt"""
+        parts = []
+        if self._summary:
+            parts.append(f"Summary so far: {self._summary}")
+        if self._slots:
+            parts.append(f"Known slots: {orjson.dumps(self._slots).decode()}")
+        if not parts:
+            return None
+        return {"role": "system", "content": "\n".join(parts)}
+    
+    def _record_turn(self, question: str, answer: Optional[str]):
+        """Append a user question and clean assistant answer to the history"""
+        # Only store user questions and simplified assistant responses
+        self._append_history({"role": "user", "content": question})
+        if answer:
+            # Store only the clean text response, not tool call info
+            clean_response = answer.split("<function")[0].strip()  # Remove any leaked function syntax
+            if clean_response:
+                self._append_history({"role": "assistant", "content": clean_response})
+        
+        # Summarize off the request path: the turn returns now, the summary lands before a later turn
+        if len(self.conversation_history) > HISTORY_SUMMARY_THRESHOLD and self._compaction is None:
+            self._compaction = asyncio.create_task(self._compact_history())
+    
+    def _append_history(self, message: dict):
+        if len(self.conversation_history) == self.conversation_history.maxlen:
+            logger.warning("Conversation history is full and not yet summarized; dropping the oldest message")
+        self.conversation_history.append(message)
+    
+    async def _compact_history(self):
+        """Fold older turns into the running summary (background task started by _record_turn)"""
+        try:
+            older = list(self.conversation_history)[:-HISTORY_KEEP_RECENT]
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in older)
+            if self._summary:
+                transcript = f"Previous summary: {self._summary}\n{transcript}"
             
-            feature_ids = [f.id for f in filtered]
+            try:
+                response = await self.client.chat.completions.create(
+                    model=SUMMARY_MODEL,
+                    messages=[
+                        {"role": "system", "content": "Summarize this conversation about a mobile mapping campaign in 2-3 sentences. Keep the feature types, conditions and image IDs that were discussed."},
+                        {"role": "user", "content": transcript}
+                    ],
+                    temperature=0,
+                    max_tokens=200
+                )
+            except Exception:
+                # Keep the raw history and retry after the next turn
+                logger.warning("Summarizing conversation history failed", exc_info=True)
+                return
             
-            # Return both data and map command
-            return {
-                "count": len(filtered),
+            # Turns recorded (or a clear) while the summary was generated may have
+            # shifted the history; only fold the messages if they are still the oldest
+            if len(self.conversation_history) < len(older) or any(
+                current is not summarized for current, summarized in zip(self.conversation_history, older)
+            ):
+                return
+            self._summary = (response.choices[0].message.content or "").strip() or self._summary
+            for _ in older:
+                self.conversation_history.popleft()
+        finally:
+            self._compaction = None
+    
+    def execute_tool(self, tool_name: str, tool_input: dict) -> dict:
+        """Execute a tool and return results + map commands"""
+        handler = self._dispatch.get(tool_name)
+        return handler(tool_input) if handler else {"error": f"Unknown tool: {tool_name}"}
+    
+    def _tool_show_features(self, tool_input: dict) -> dict:
+        # Combined: query + highlight in one step
+        feature_type = tool_input.get("feature_type", "all")
+        condition = tool_input.get("condition", "any")
+        color = tool_input.get("color", "#FF0000")
+        
+        feature_ids = self._state.feature_ids[self._filter_mask(feature_type, condition)].tolist()
+        
+        # Return both data and map command
+        return {
+            "count": len(feature_ids),
+            "feature_ids": feature_ids,
+            "map_command": {
+                "command": "highlight_features",
                 "feature_ids": feature_ids,
-                "map_command": {
-                    "command": "highlight_features",
-                    "feature_ids": feature_ids,
-                    "color": color,
-                    "label": feature_type.replace("_", " ").title()
-                },
-                "message": f"Found and highlighted {len(filtered)} {feature_type} features"
-            }
+                "color": color,
+                "label": feature_type.replace("_", " ").title()
+            },
+            "message": f"Found and highlighted {len(feature_ids)} {feature_type} features"
+        }
+    
+    def _tool_query_images(self, tool_input: dict) -> dict:
+        # Query image positions
+        return self._query_images_result
+    
+    def _tool_get_campaign_summary(self, tool_input: dict) -> dict:
+        return {
+            "campaign": self.campaign.name,
+            "total_features": self.campaign.total_features,
+            "total_images": self.campaign.total_images,
+            "features_by_type": _count_codes(self._state.feature_type_codes, FEATURE_TYPES),
+            "features_by_condition": _count_codes(self._state.feature_condition_codes, FEATURE_CONDITIONS),
+            "message": f"Campaign {self.campaign.name} has {self.campaign.total_features} features and {self.campaign.total_images} image positions"
+        }
+    
+    def _tool_find_images_with_features(self, tool_input: dict) -> dict:
+        # Find images containing specific features
+        feature_type = tool_input.get("feature_type", "any")
+        condition = tool_input.get("condition", "any")
         
-        elif tool_name == "query_images":
-            # Query image positions
-            image_count = len(self.campaign.images)
-            return {
-                "count": image_count,
-                "message": f"Campaign has {image_count} image positions (shown as blue camera dots on the map)"
-            }
+        # Filter features first
+        mask = self._filter_mask(feature_type, condition)
+        feature_id_list = self._state.feature_ids[mask].tolist()
         
-        elif tool_name == "find_images_with_features":
-            # Find images containing specific features
-            feature_type = tool_input.get("feature_type", "any")
-            condition = tool_input.get("condition", "any")
-            
-            # Filter features first
-            filtered_features = self.campaign.features
-            if feature_type != "any":
-                filtered_features = [f for f in filtered_features if f.type == feature_type]
-            if condition != "any":
-                filtered_features = [f for f in filtered_features if f.condition == condition]
-            
-            feature_ids = set(f.id for f in filtered_features)
-            
-            # Find images that contain these features
-            matching_images = []
-            matching_image_ids = []
-            for img in self.campaign.images:
-                img_features = set(img.feature_ids) & feature_ids
-                if img_features:
-                    matching_images.append({
-                        "image_id": img.id,
-                        "feature_count": len(img_features),
-                        "coordinates": img.geometry["coordinates"]
-                    })
-                    matching_image_ids.append(img.id)
-            
-            # Highlight both features and images
-            map_commands = []
-            if filtered_features:
-                map_commands.append({
-                    "command": "highlight_features",
-                    "feature_ids": [f.id for f in filtered_features],
-                    "color": "#00FF00",
-                    "label": f"{feature_type} features"
-                })
-            if matching_image_ids:
-                map_commands.append({
-                    "command": "highlight_image",
-                    "image_ids": matching_image_ids,
-                    "color": "#4A90E2",
-                    "label": f"Images with {feature_type}"
-                })
-            
-            return {
-                "image_count": len(matching_images),
-                "images": matching_images,
-                "feature_count": len(filtered_features),
-                "map_commands": map_commands,
-                "message": f"Found {len(matching_images)} images containing {len(filtered_features)} matching features"
-            }
+        # Find images that contain these features
+        counts, _ = self._image_match_counts(mask)
+        matching_images = []
+        matching_image_ids = []
+        for idx in np.flatnonzero(counts).tolist():
+            img = self.campaign.images[idx]
+            matching_images.append({
+                "image_id": img.id,
+                "feature_count": int(counts[idx]),
+                "coordinates": list(img.coordinates)
+            })
+            matching_image_ids.append(img.id)
         
-        elif tool_name == "find_richest_image":
-            # Find image with most features
-            feature_type = tool_input.get("feature_type", "any")
-            condition = tool_input.get("condition", "any")
-            
-            # Filter features
-            filtered_features = self.campaign.features
-            if feature_type != "any":
-                filtered_features = [f for f in filtered_features if f.type == feature_type]
-            if condition != "any":
-                filtered_features = [f for f in filtered_features if f.condition == condition]
-            
-            feature_ids = set(f.id for f in filtered_features)
-            
-            # Count features per image
-            richest_image = None
-            max_count = 0
-            
-            for img in self.campaign.images:
-                img_features = set(img.feature_ids) & feature_ids
-                if len(img_features) > max_count:
-                    max_count = len(img_features)
-                    richest_image = {
-                        "image_id": img.id,
-                        "feature_count": max_count,
-                        "coordinates": img.geometry["coordinates"],
-                        "feature_ids": list(img_features)
-                    }
-            
-            # Highlight the features from richest image
-            map_command = None
-            if richest_image:
-                map_command = {
-                    "command": "highlight_features",
-                    "feature_ids": richest_image["feature_ids"],
-                    "color": "#FF00FF",
-                    "label": f"Image {richest_image['image_id']}"
-                }
-            
-            return {
-                "richest_image": richest_image,
-                "map_command": map_command,
-                "message": f"Image {richest_image['image_id']} has the most features ({max_count})" if richest_image else "No matching images found"
-            }
+        # Highlight both features and images
+        map_commands = []
+        if feature_id_list:
+            map_commands.append({
+                "command": "highlight_features",
+                "feature_ids": feature_id_list,
+                "color": "#00FF00",
+                "label": f"{feature_type} features"
+            })
+        if matching_image_ids:
+            map_commands.append({
+                "command": "highlight_image",
+                "image_ids": matching_image_ids,
+                "color": "#4A90E2",
+                "label": f"Images with {feature_type}"
+            })
         
-        elif tool_name == "highlight_on_map":
-            # Validate feature_ids
-            feature_ids = tool_input.get("feature_ids", [])
-            if not feature_ids:
-                return {
-                    "error": "No feature_ids provided. You must first call query_features to get feature IDs, then pass those IDs to highlight_on_map."
-                }
-            
-            # Return a map command
-            return {
-                "map_command": {
-                    "command": "highlight_features",
-                    "feature_ids": feature_ids,
-                    "color": tool_input.get("color", "#FF0000"),
-                    "label": tool_input.get("label")
-                },
-                "message": f"Highlighted {len(feature_ids)} features on the map"
+        return {
+            "image_count": len(matching_images),
+            "images": matching_images,
+            "feature_count": len(feature_id_list),
+            "map_commands": map_commands,
+            "message": f"Found {len(matching_images)} images containing {len(feature_id_list)} matching features"
+        }
+    
+    def _tool_find_richest_image(self, tool_input: dict) -> dict:
+        # Find image with most features
+        feature_type = tool_input.get("feature_type", "any")
+        condition = tool_input.get("condition", "any")
+        
+        # Filter features
+        mask = self._filter_mask(feature_type, condition)
+        
+        # Count features per image, only materializing the winner's IDs
+        counts, entry_hits = self._image_match_counts(mask)
+        best = int(counts.argmax()) if len(counts) else 0
+        max_count = int(counts[best]) if len(counts) else 0
+        
+        richest_image = None
+        if max_count > 0:
+            best_image = self.campaign.images[best]
+            start, end = self._state.image_offsets[best], self._state.image_offsets[best + 1]
+            winner_ids = self._state.feature_ids[self._state.image_feature_rows[start:end][entry_hits[start:end]]]
+            richest_image = {
+                "image_id": best_image.id,
+                "feature_count": max_count,
+                "coordinates": list(best_image.coordinates),
+                "feature_ids": winner_ids.tolist()
             }
         
-        elif tool_name == "show_statistics":
-            # Return a map command
-            return {
-                "map_command": {
-                    "command": "show_statistics",
-                    "title": tool_input["title"],
-                    "stats": tool_input["stats"]
-                },
-                "message": f"Displayed statistics: {tool_input['title']}"
+        # Highlight the features from richest image
+        map_command = None
+        if richest_image:
+            map_command = {
+                "command": "highlight_features",
+                "feature_ids": richest_image["feature_ids"],
+                "color": "#FF00FF",
+                "label": f"Image {richest_image['image_id']}"
             }
         
-        elif tool_name == "clear_map":
+        return {
+            "richest_image": richest_image,
+            "map_command": map_command,
+            "message": f"Image {richest_image['image_id']} has the most features ({max_count})" if richest_image else "No matching images found"
+        }
+    
+    def _tool_highlight_on_map(self, tool_input: dict) -> dict:
+        # Validate feature_ids
+        feature_ids = tool_input.get("feature_ids", [])
+        if not feature_ids:
             return {
-                "map_command": {
-                    "command": "clear_highlights"
-                },
-                "message": "Cleared all highlights from the map"
+                "error": "No feature_ids provided. You must first call query_features to get feature IDs, then pass those IDs to highlight_on_map."
             }
         
-        return {"error": f"Unknown tool: {tool_name}"}
+        # Return a map command
+        return {
+            "map_command": {
+                "command": "highlight_features",
+                "feature_ids": feature_ids,
+                "color": tool_input.get("color", "#FF0000"),
+                "label": tool_input.get("label")
+            },
+            "message": f"Highlighted {len(feature_ids)} features on the map"
+        }
+    
+    def _tool_show_statistics(self, tool_input: dict) -> dict:
+        # Return a map command
+        return {
+            "map_command": {
+                "command": "show_statistics",
+                "title": tool_input["title"],
+                "stats": tool_input["stats"]
+            },
+            "message": f"Displayed statistics: {tool_input['title']}"
+        }
+    
+    def _tool_clear_map(self, tool_input: dict) -> dict:
+        return self._clear_map_result
+    
+    def _prepare(self, question: str) -> tuple[tuple, list[dict]]:
+        """Build the response-cache key and the message list for a question"""
+        # Static system prompt first so the prefix is identical across calls,
+        # then summary/slots, conversation history and the current question
+        memory_message = self._memory_message()
+        
+        cache_key = (
+            question.strip().lower(),
+            memory_message["content"] if memory_message else None,
+            tuple((m["role"], m["content"]) for m in self.conversation_history)
+        )
+        
+        messages = [
+            SYSTEM_MESSAGE,
+            *([memory_message] if memory_message else []),
+            *self.conversation_history,
+            {"role": "user", "content": question}
+        ]
+        return cache_key, messages
+    
+    async def _replay_cached(self, cache_key: tuple, question: str) -> Optional[dict]:
+        """Same question in the same context: replay the cached answer"""
+        cached = self._resp_cache.get(cache_key)
+        if cached is None:
+            return None
+        
+        self._resp_cache.move_to_end(cache_key)
+        for tool_use in cached["tool_uses"]:
+            self._update_slots(tool_use["tool"], tool_use["input"], tool_use["result"])
+        self._record_turn(question, cached["answer"])
+        return {**cached, "tokens": 0}
     
-    def ask(self, question: str) -> dict:
+    def _store_cached(self, cache_key: tuple, result: dict):
+        self._resp_cache[cache_key] = result
+        if len(self._resp_cache) > RESPONSE_CACHE_SIZE:
+            self._resp_cache.popitem(last=False)
+    
+    def _run_tools(self, message, messages: list[dict]) -> tuple[list[dict], list[dict]]:
+        """Execute the model's tool calls, appending results to messages"""
+        tool_uses = []
+        map_commands = []
+        
+        for tool_call in message.tool_calls:
+            try:
+                tool_name = tool_call.function.name
+                tool_input = orjson.loads(tool_call.function.arguments)
+                
+                # Execute tool
+                result = self.execute_tool(tool_name, tool_input)
+                self._update_slots(tool_name, tool_input, result)
+                
+                # Serialize once: the same bytes feed the LLM and the HTTP response
+                result_json = orjson.dumps(result)
+                
+                # Track tool use
+                tool_uses.append({
+                    "tool": tool_name,
+                    "input": tool_input,
+                    "result": result,
+                    "_result_json": result_json
+                })
+                
+                # Extract map commands (single or multiple)
+                if "map_command" in result:
+                    map_commands.append(result["map_command"])
+                if "map_commands" in result:
+                    map_commands.extend(result["map_commands"])
+                
+                # Add to conversation
+                messages.append({
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [tool_call]
+                })
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call.id,
+                    "name": tool_name,
+                    "content": result_json.decode()
+                })
+            except Exception as e:
+                # Log error but continue
+                print(f"Error executing tool {tool_call.function.name}: {str(e)}")
+                messages.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call.id,
+                    "name": tool_call.function.name,
+                    "content": orjson.dumps({"error": str(e)}).decode()
+                })
+        
+        return tool_uses, map_commands
+    
+    async def ask(self, question: str) -> dict:
         """
         Process a natural language question and return:
         - Answer text
         - Tool uses
         - Map commands to execute
         """
-        
-        # System prompt to guide the model
-        system_prompt = f"""You are a helpful assistant for a mobile mapping campaign in San Bernardino with {self.campaign.total_features} features and {self.campaign.total_images} image positions.
-
-Use the provided tools to answer user questions. Your text responses should be plain, natural language only.
-
-TOOL USAGE:
-- show_features: Show/find features on map
-- find_images_with_features: Find which images contain specific features
-- find_richest_image: Find image position with most features
-- query_images: Get total image count
-
-HORIZONTAL FEATURES (on ground): pavement_damage, road_marking, manhole_cover, drainage_grate, pavement_patch
-VERTICAL FEATURES (above ground): traffic_sign, street_light, utility_pole, trash_bin, fire_hydrant, traffic_light, vegetation
-
-Conditions: good, fair, poor, damaged"""
-
-        # Start with system prompt + conversation history
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history (keep last 10 messages for context)
-        messages.extend(self.conversation_history[-10:])
-        
-        # Add current question
-        messages.append({"role": "user", "content": question})
+        async with self._lock:
+            self._sync_state()
+            return await self._ask(question)
+    
+    async def _ask(self, question: str) -> dict:
+        cache_key, messages = self._prepare(question)
+        cached = await self._replay_cached(cache_key, question)
+        if cached is not None:
+            return cached
         
         # Step 1: Initial LLM call
-        response = self.client.chat.completions.create(
+        response = await self.client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=messages,
             tools=MAPPING_TOOLS,
@@ -405,51 +757,10 @@ Conditions: good, fair, poor, damaged"""
         
         # Step 2: Execute tool calls if any
         if message.tool_calls:
-            for tool_call in message.tool_calls:
-                try:
-                    tool_name = tool_call.function.name
-                    tool_input = json.loads(tool_call.function.arguments)
-                    
-                    # Execute tool
-                    result = self.execute_tool(tool_name, tool_input)
-                    
-                    # Track tool use
-                    tool_uses.append({
-                        "tool": tool_name,
-                        "input": tool_input,
-                        "result": result
-                    })
-                    
-                    # Extract map commands (single or multiple)
-                    if "map_command" in result:
-                        map_commands.append(result["map_command"])
-                    if "map_commands" in result:
-                        map_commands.extend(result["map_commands"])
-                    
-                    # Add to conversation
-                    messages.append({
-                        "role": "assistant",
-                        "content": None,
-                        "tool_calls": [tool_call]
-                    })
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
-                        "content": json.dumps(result)
-                    })
-                except Exception as e:
-                    # Log error but continue
-                    print(f"Error executing tool {tool_call.function.name}: {str(e)}")
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_call.function.name,
-                        "content": json.dumps({"error": str(e)})
-                    })
+            tool_uses, map_commands = self._run_tools(message, messages)
             
             # Step 3: Get final response with tool results
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model="llama-3.3-70b-versatile",
                 messages=messages,
                 temperature=0.1
@@ -457,22 +768,95 @@ Conditions: good, fair, poor, damaged"""
             message = response.choices[0].message
         
         # Update conversation history (store context but keep it clean)
-        # Only store user questions and simplified assistant responses
-        self.conversation_history.append({"role": "user", "content": question})
-        if message.content:
-            # Store only the clean text response, not tool call info
-            clean_response = message.content.split("<function")[0].strip()  # Remove any leaked function syntax
-            if clean_response:
-                self.conversation_history.append({"role": "assistant", "content": clean_response})
+        self._record_turn(question, message.content)
         
-        return {
+        result = {
             "answer": message.content or "I've updated the map.",
             "tool_uses": tool_uses,
             "map_commands": map_commands,
             "tokens": response.usage.total_tokens if response.usage else 0
         }
+        self._store_cached(cache_key, result)
+        return result
+    
+    async def ask_stream(self, question: str) -> AsyncIterator[dict]:
+        """
+        Streaming variant of ask(). Yields events:
+        - {"type": "map", "map_commands": [...], "tool_uses": [...]} as soon as tools finish
+        - {"type": "token", "delta": "..."} for each chunk of the answer text
+        - {"type": "done", "answer": "...", "tokens": N} at the end
+        """
+        async with self._lock:
+            self._sync_state()
+            async for event in self._ask_stream(question):
+                yield event
+    
+    async def _ask_stream(self, question: str) -> AsyncIterator[dict]:
+        cache_key, messages = self._prepare(question)
+        cached = await self._replay_cached(cache_key, question)
+        if cached is not None:
+            yield {"type": "map", "map_commands": cached["map_commands"], "tool_uses": dumps_tool_uses(cached["tool_uses"])}
+            yield {"type": "token", "delta": cached["answer"]}
+            yield {"type": "done", "answer": cached["answer"], "tokens": 0}
+            return
+        
+        # Step 1: Initial LLM call (tool selection is not streamed)
+        response = await self.client.chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=messages,
+            tools=MAPPING_TOOLS,
+            tool_choice="auto",
+            temperature=0.1
+        )
+        
+        message = response.choices[0].message
+        tool_uses = []
+        map_commands = []
+        
+        if not message.tool_calls:
+            content = message.content
+            tokens = response.usage.total_tokens if response.usage else 0
+            yield {"type": "map", "map_commands": [], "tool_uses": []}
+            if content:
+                yield {"type": "token", "delta": content}
+        else:
+            # Step 2: Execute tools and push map commands before the answer is ready
+            tool_uses, map_commands = self._run_tools(message, messages)
+            yield {"type": "map", "map_commands": map_commands, "tool_uses": dumps_tool_uses(tool_uses)}
+            
+            # Step 3: Stream the final response with tool results
+            stream = await self.client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=messages,
+                temperature=0.1,
+                stream=True
+            )
+            parts = []
+            tokens = 0
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    parts.append(delta)
+                    yield {"type": "token", "delta": delta}
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and x_groq.usage is not None:
+                    tokens = x_groq.usage.total_tokens
+            content = "".join(parts)
+        
+        self._record_turn(question, content)
+        
+        answer = content or "I've updated the map."
+        self._store_cached(cache_key, {
+            "answer": answer,
+            "tool_uses": tool_uses,
+            "map_commands": map_commands,
+            "tokens": tokens
+        })
+        yield {"type": "done", "answer": answer, "tokens": tokens}
     
     def clear_history(self):
         """Clear conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self._summary = None
+        self._slots = {}
 
@@ -2,25 +2,59 @@
 FastAPI backend for mobile mapping viewer
 """
 import os
+import logging
 import math
+import functools
+import queue
+import threading
+import time
+import orjson
+from io import BytesIO
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, FileResponse
-from pydantic import BaseModel
-from typing import List, Optional
-from agent_service import MappingAgent
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, FileResponse, ORJSONResponse, StreamingResponse
+from starlette.datastructures import Headers
+from groq import AsyncGroq
+from pydantic import BaseModel, Field
+from typing import Iterator, List, Literal, Optional
+from agent_service import MappingAgent, dumps_response
 from service import MappingService
+from models.domain import FEATURE_CONDITIONS, FEATURE_TYPES, FeatureColumns, ImageColumns
+import rasterio
+from rio_tiler.errors import TileOutsideBounds
 from rio_tiler.io import Reader
 from rio_tiler.models import ImageData
 import numpy as np
+from PIL import Image
 
 # Load .env from project root
 env_path = Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-app = FastAPI(title="Mobile Mapping Viewer API")
+# Show the campaign loader's progress (other libraries stay at WARNING);
+# set LOG_LEVEL=WARNING to mute it
+logging.basicConfig(format="%(message)s")
+logging.getLogger("service").setLevel(os.getenv("LOG_LEVEL", "INFO"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await GROQ_CLIENT.close()
+    # Close pooled COG datasets on shutdown
+    while True:
+        try:
+            _cog_readers.get_nowait().dataset.close()
+        except queue.Empty:
+            break
+
+
+app = FastAPI(title="Mobile Mapping Viewer API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # CORS for frontend
 app.add_middleware(
@@ -31,18 +65,166 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize agent (in production, would be per-session)
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values ("gzip;q=0" refuses it)"""
+    wildcard = False
+    for entry in accept_encoding.split(","):
+        coding, *params = entry.split(";")
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        coding = coding.strip().lower()
+        if coding == "gzip":
+            return q > 0
+        if coding == "*":
+            wildcard = q > 0
+    return wildcard  # gzip not listed: only acceptable through "*"
+
+
+class QValueGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that honours Accept-Encoding q-values; Starlette's only looks for "gzip" in the header"""
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not _accepts_gzip(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress JSON payloads (tool results can carry long ID/coordinate lists).
+# Responses that already set Content-Encoding (e.g. /campaign) pass through.
+# Level 6 instead of Starlette's default 9: ~4x less CPU per response on
+# this JSON for a few percent larger output.
+app.add_middleware(QValueGZipMiddleware, minimum_size=1024, compresslevel=6)
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     raise RuntimeError("GROQ_API_KEY environment variable not set")
 
-agent = MappingAgent(GROQ_API_KEY)
+# Load campaign data at startup rather than on the first request
+MappingService.get_campaign()
+
+# One agent per session so conversation history and response caches don't mix
+# between users. Idle sessions are swept after SESSION_TTL_SECONDS, and at most
+# MAX_SESSIONS are kept (least recently used evicted first). All agents share one
+# Groq client, so an evicted agent holds no connections of its own.
+SESSION_TTL_SECONDS = 30 * 60
+SESSION_SWEEP_INTERVAL = 60
+MAX_SESSIONS = 256
+SESSIONS: OrderedDict[str, tuple[MappingAgent, float]] = OrderedDict()
+GROQ_CLIENT = AsyncGroq(api_key=GROQ_API_KEY)
+_last_sweep = time.monotonic()
+
+
+def get_agent(session_id: str) -> MappingAgent:
+    """Get (or create) the agent for a session and mark it as recently used"""
+    global _last_sweep
+    now = time.monotonic()
+    
+    if now - _last_sweep > SESSION_SWEEP_INTERVAL:
+        for sid, (_, last_seen) in list(SESSIONS.items()):
+            if now - last_seen > SESSION_TTL_SECONDS:
+                del SESSIONS[sid]
+        _last_sweep = now
+    
+    entry = SESSIONS.get(session_id)
+    agent = entry[0] if entry else MappingAgent(GROQ_API_KEY, client=GROQ_CLIENT)
+    SESSIONS[session_id] = (agent, now)
+    SESSIONS.move_to_end(session_id)
+    while len(SESSIONS) > MAX_SESSIONS:
+        SESSIONS.popitem(last=False)
+    return agent
+
+
+@MappingService.on_reload
+def _reset_campaign_state():
+    """Point everything derived from the campaign at the one the service just reloaded"""
+    # Hotspots are keyed by campaign generation; this only frees the stale entries
+    _compute_hotspots.cache_clear()
+    # Sessions keep their conversations and switch to the new data at their next turn
+    MappingAgent.refresh_shared_state()
+
+# Campaign data rarely changes (edits are picked up on the next /campaign), so let browsers reuse it briefly
+CAMPAIGN_CACHE_MAX_AGE = 300
+
+# Hotspot elevation adjustment (degrees) per feature type, indexed like
+# FEATURE_TYPES. The camera is ~1.5m high.
+_ELEVATION_OFFSET_BY_TYPE = {
+    # Horizontal features: assume on ground, look down (-10 to -30 degrees)
+    'pavement_damage': -15, 'pavement_patch': -15, 'road_marking': -15,
+    'crosswalk': -15, 'manhole_cover': -15, 'drainage_grate': -15,
+    # Signs: typically 2-3m high, slight upward angle
+    'traffic_sign': 5, 'stop_sign': 5, 'speed_limit': 5,
+    # Lights: high up, look up more
+    'traffic_light': 15, 'street_light': 15,
+    # Mid-height objects, roughly eye level
+    'utility_pole': 0, 'fire_hydrant': 0, 'trash_bin': 0,
+}
+# Anything else uses the calculated angle. Looked up by type code, so the
+# adjustment is one gather instead of a branch per feature.
+ELEVATION_OFFSETS = np.array([_ELEVATION_OFFSET_BY_TYPE.get(t, 0) for t in FEATURE_TYPES], dtype=np.float64)
+
+# Features farther than this from the camera get no hotspot (meters)
+MAX_HOTSPOT_DISTANCE = 100
+
+# COG file path (use symlinked version from mockup data). Prefer the Web
+# Mercator aligned copy written by proto/optimize_cog.py: tiles then come
+# from aligned block reads instead of an on-the-fly warp.
+ORTHO_DIR = Path(__file__).parent.parent / "mockup_data" / "track_2020" / "data" / "images" / "ortho"
+COG_PATH = ORTHO_DIR / "san_bernardino_201020_webopt.tif"
+if not COG_PATH.exists():
+    COG_PATH = ORTHO_DIR / "san_bernardino_201020.tif"
+
+# Opening the COG parses its header and overview/block maps, so readers are
+# kept open and reused. GDAL datasets aren't thread-safe, so each request
+# borrows its own reader from the pool (one per concurrent request at most).
+_cog_readers: "queue.SimpleQueue[Reader]" = queue.SimpleQueue()
+
+
+@contextmanager
+def cog_reader() -> Iterator[Reader]:
+    """Borrow an open COG reader for the duration of a request"""
+    try:
+        cog = _cog_readers.get_nowait()
+    except queue.Empty:
+        # Opened outside a `with` block so it isn't tied to this thread's GDAL env
+        cog = Reader(str(COG_PATH), dataset=rasterio.open(COG_PATH))
+    try:
+        yield cog
+    finally:
+        _cog_readers.put(cog)
+
+
+# Encoded tiles never change for a given COG, so recently served ones are
+# returned as stored bytes without another read + encode
+TILE_CACHE_SIZE = 512
+_tile_cache: OrderedDict[tuple[int, int, int, str], tuple[bytes, str]] = OrderedDict()
+_tile_cache_lock = threading.Lock()
+
+
+def _build_empty_tile() -> bytes:
+    """Encode the 256x256 transparent PNG served for tiles outside the COG"""
+    buf = BytesIO()
+    Image.new('RGBA', (256, 256), (0, 0, 0, 0)).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+_EMPTY_TILE_PNG = _build_empty_tile()
+
+# The COG's metadata and WGS84 bounds are fixed for the life of the file, so
+# /cog/info computes them (incl. the PROJ transform) once
+_cog_info: Optional[dict] = None
 
-# COG file path (use symlinked version from mockup data)
-COG_PATH = Path(__file__).parent.parent / "mockup_data" / "track_2020" / "data" / "images" / "ortho" / "san_bernardino_201020.tif"
 
 class AskRequest(BaseModel):
     question: str
+    session_id: str = Field("default", max_length=64)  # Per-tab id sent by the frontend
 
 
 @app.get("/")
@@ -51,21 +233,26 @@ def read_root():
 
 
 @app.get("/campaign")
-def get_campaign():
-    """Get the current campaign data"""
-    campaign = MappingService.get_campaign()
-    return campaign.model_dump()
+def get_campaign(request: Request):
+    """Get the current campaign data (serialized and gzipped once, served from memory)"""
+    headers = {"Cache-Control": f"public, max-age={CAMPAIGN_CACHE_MAX_AGE}", "Vary": "Accept-Encoding"}
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        content = MappingService.get_campaign_json_gzip()
+    else:
+        content = MappingService.get_campaign_json()
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @app.post("/ask")
-def ask_question(request: AskRequest):
+async def ask_question(request: AskRequest):
     """
     Ask a question to the AI agent
     Returns: answer text + map commands to execute
     """
     try:
-        result = agent.ask(request.question)
-        return result
+        result = await get_agent(request.session_id).ask(request.question)
+        return Response(content=dumps_response(result), media_type="application/json")
     except Exception as e:
         import traceback
         print(f"Error in ask_question: {str(e)}")
@@ -73,21 +260,48 @@ def ask_question(request: AskRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: AskRequest):
+    """
+    Streaming version of /ask (Server-Sent Events).
+    Map commands are sent as soon as tools finish, then the answer text streams in.
+    """
+    agent = get_agent(request.session_id)
+    
+    async def event_stream():
+        try:
+            async for event in agent.ask_stream(request.question):
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            import traceback
+            print(f"Error in ask_question_stream: {str(e)}")
+            print(traceback.format_exc())
+            yield b"data: " + orjson.dumps({"type": "error", "detail": str(e)}) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.post("/clear")
-def clear_conversation():
-    """Clear conversation history"""
-    agent.clear_history()
+def clear_conversation(session_id: str = Query("default", max_length=64)):
+    """Clear conversation history for a session"""
+    entry = SESSIONS.get(session_id)
+    if entry:
+        entry[0].clear_history()
     return {"status": "cleared"}
 
 
 @app.get("/cog/info")
 def get_cog_info():
     """Get COG metadata (bounds, center, etc.)"""
+    global _cog_info
+    if _cog_info is not None:
+        return _cog_info
+    
     if not COG_PATH.exists():
         raise HTTPException(status_code=404, detail=f"COG file not found: {COG_PATH}")
     
     try:
-        with Reader(str(COG_PATH)) as cog:
+        with cog_reader() as cog:
             info = cog.info()
             
             # Get geographic bounds (WGS84) using the reader's dataset
@@ -111,7 +325,7 @@ def get_cog_info():
             # Calculate center
             center = [(wgs84_bounds[0] + wgs84_bounds[2]) / 2, (wgs84_bounds[1] + wgs84_bounds[3]) / 2]
             
-            return {
+            _cog_info = {
                 "bounds": list(wgs84_bounds),  # [minx, miny, maxx, maxy] in WGS84
                 "center": center,  # [lon, lat]
                 "width": info.width,
@@ -120,6 +334,7 @@ def get_cog_info():
                 "maxzoom": 22,
                 "band_count": info.count
             }
+            return _cog_info
     except Exception as e:
         import traceback
         print(f"Error reading COG: {str(e)}")
@@ -128,29 +343,71 @@ def get_cog_info():
 
 
 @app.get("/cog/tiles/{z}/{x}/{y}.png")
-def get_cog_tile(z: int, x: int, y: int):
+def get_cog_tile(
+    z: int,
+    x: int,
+    y: int,
+    # A fixed set of values, so arbitrary query strings can't fill the tile cache with junk keys
+    fmt: Literal["png", "jpg"] = Query("png", description="Tile encoding: png, or jpg to use JPEG for fully opaque tiles")
+):
     """Serve COG tiles in XYZ format"""
     if not COG_PATH.exists():
         raise HTTPException(status_code=404, detail="COG file not found")
     
+    key = (z, x, y, fmt)
+    with _tile_cache_lock:
+        cached = _tile_cache.get(key)
+        if cached:
+            _tile_cache.move_to_end(key)
+    if cached:
+        return Response(content=cached[0], media_type=cached[1])
+    
     try:
-        with Reader(str(COG_PATH)) as cog:
+        with cog_reader() as cog:
             # Read the tile
             img = cog.tile(x, y, z)
-            
+        
+        # JPEG encodes much faster and smaller than PNG but has no alpha, so
+        # only use it when no pixel of the tile is masked out
+        if fmt == "jpg" and (img.mask == 255).all():
+            content, media_type = img.render(add_mask=False, img_format="JPEG", QUALITY=85), "image/jpeg"
+        else:
             # Convert to PNG
-            png_data = img.render(img_format="PNG")
-            
-            return Response(content=png_data, media_type="image/png")
+            content, media_type = img.render(img_format="PNG"), "image/png"
+        
+        with _tile_cache_lock:
+            _tile_cache[key] = (content, media_type)
+            if len(_tile_cache) > TILE_CACHE_SIZE:
+                _tile_cache.popitem(last=False)
+        
+        return Response(content=content, media_type=media_type)
+    except TileOutsideBounds:
+        # Outside the COG the tile is empty for good, so let browsers keep it
+        return Response(
+            content=_EMPTY_TILE_PNG,
+            media_type="image/png",
+            headers={"Cache-Control": "public, max-age=86400"},
+        )
     except Exception as e:
-        # Return transparent tile if error (tile might be outside bounds)
-        # Create a 256x256 transparent PNG
-        from io import BytesIO
-        from PIL import Image
-        img = Image.new('RGBA', (256, 256), (0, 0, 0, 0))
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        return Response(content=buf.getvalue(), media_type="image/png")
+        # Return transparent tile if error, but don't let a transient failure
+        # (reader or I/O error) stick as a blank tile in caches
+        return Response(
+            content=_EMPTY_TILE_PNG,
+            media_type="image/png",
+            headers={"Cache-Control": "no-store"},
+        )
+
+
+@functools.lru_cache(maxsize=4096)
+def _sniff_image_type(image_path: Path, mtime_ns: int) -> str:
+    """Detect actual image type by checking magic bytes (file could be PNG despite .jpg extension)"""
+    with open(image_path, 'rb') as f:
+        header = f.read(8)
+    if header.startswith(b'\x89PNG'):
+        return "image/png"
+    elif header.startswith(b'\xff\xd8\xff'):
+        return "image/jpeg"
+    return "application/octet-stream"
 
 
 @app.get("/images/{image_id}")
@@ -158,22 +415,19 @@ def get_image(image_id: int):
     """Serve 360° spherical images"""
     image_path = Path(__file__).parent.parent / "mockup_data" / "track_2020" / "data" / "images" / "spherical" / f"{image_id}.png"
     
-    if not image_path.exists():
+    # One stat, reused by FileResponse (which otherwise stats again before sending)
+    try:
+        stat_result = os.stat(image_path)
+    except OSError:
         raise HTTPException(status_code=404, detail=f"Image not found: {image_id}")
     
-    # Detect actual image type by checking magic bytes (file could be PNG despite .jpg extension)
-    with open(image_path, 'rb') as f:
-        header = f.read(8)
-        if header.startswith(b'\x89PNG'):
-            mime_type = "image/png"
-        elif header.startswith(b'\xff\xd8\xff'):
-            mime_type = "image/jpeg"
-        else:
-            mime_type = "application/octet-stream"
+    # Sniffed once per file version
+    mime_type = _sniff_image_type(image_path, stat_result.st_mtime_ns)
     
     return FileResponse(
         image_path, 
         media_type=mime_type,
+        stat_result=stat_result,
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, OPTIONS",
@@ -212,6 +466,26 @@ def get_krpano_xml(image_url: str):
     )
 
 
+def _bearings_and_distances(lat1, lon1, sin_lat1, cos_lat1, lat2, lon2, sin_lat2, cos_lat2):
+    """
+    Initial bearing (degrees, 0-360) and haversine distance (meters) from one
+    point to many. The half-angle sines are computed once and squared by
+    multiplication; 2 * 6371000 m (Earth radius) is folded into one constant.
+    """
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    
+    y = np.sin(dlon) * cos_lat2
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * np.cos(dlon)
+    bearings = (np.degrees(np.arctan2(y, x)) + 360) % 360
+    
+    sin_dlat2 = np.sin(dlat * 0.5)
+    sin_dlon2 = np.sin(dlon * 0.5)
+    a = sin_dlat2 * sin_dlat2 + cos_lat1 * cos_lat2 * sin_dlon2 * sin_dlon2
+    distances = 12742000.0 * np.arcsin(np.sqrt(a))
+    return bearings, distances
+
+
 @app.get("/nearby/images")
 def get_nearby_images(
     image_id: int,
@@ -222,60 +496,47 @@ def get_nearby_images(
     Returns image metadata with bearing and distance.
     """
     try:
-        campaign = agent.campaign
+        cols = MappingService.get_image_columns()
         
         # Find the source image
-        source_image = None
-        for img in campaign.images:
-            if img.id == image_id:
-                source_image = img
-                break
-        
-        if not source_image:
+        source_index = cols.row_of.get(image_id)
+        if source_index is None:
             raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
         
-        # Source camera position
-        src_coords = source_image.geometry['coordinates']
-        src_lon = src_coords[0]
-        src_lat = src_coords[1]
+        # Source camera position (radians, with cached sin/cos of latitude)
+        lat1 = cols.lat_rad[source_index]
+        sin_lat1, cos_lat1 = cols.sin_lat[source_index], cols.cos_lat[source_index]
         
-        nearby = []
+        # Great-circle distance is at least R * |dlat|, so only images in the
+        # latitude band around the source can be in range
+        band = max_distance / 6371000 * (1 + 1e-9)  # margin for float rounding
+        lo = np.searchsorted(cols.sorted_lat_rad, lat1 - band, side="left")
+        hi = np.searchsorted(cols.sorted_lat_rad, lat1 + band, side="right")
+        candidates = np.sort(cols.lat_order[lo:hi])
         
-        for img in campaign.images:
-            if img.id == image_id:
-                continue  # Skip self
-            
-            # Target camera position
-            tgt_coords = img.geometry['coordinates']
-            tgt_lon = tgt_coords[0]
-            tgt_lat = tgt_coords[1]
-            
-            # Calculate bearing and distance
-            dlon = math.radians(tgt_lon - src_lon)
-            lat1 = math.radians(src_lat)
-            lat2 = math.radians(tgt_lat)
-            
-            y = math.sin(dlon) * math.cos(lat2)
-            x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-            bearing = math.degrees(math.atan2(y, x))
-            bearing = (bearing + 360) % 360
-            
-            # Distance (haversine)
-            dlat = lat2 - lat1
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            distance = 6371000 * c
-            
-            if distance <= max_distance and distance > 0:
-                nearby.append({
-                    "image_id": img.id,
-                    "bearing": bearing,
-                    "distance": round(distance, 2),
-                    "timestamp": img.timestamp.isoformat()
-                })
+        # Bearing and distance to the candidates at once
+        bearings, distances = _bearings_and_distances(
+            lat1, cols.lon_rad[source_index], sin_lat1, cos_lat1,
+            cols.lat_rad[candidates], cols.lon_rad[candidates], cols.sin_lat[candidates], cols.cos_lat[candidates],
+        )
         
-        # Sort by distance
-        nearby.sort(key=lambda x: x['distance'])
+        # Keep images in range (skipping self), sorted by rounded distance
+        mask = (distances <= max_distance) & (distances > 0) & (candidates != source_index)
+        hits = np.flatnonzero(mask)
+        hits = hits[np.argsort(np.round(distances[hits], 2), kind="stable")]
+        
+        rows = candidates[hits]
+        nearby = [
+            {
+                "image_id": image_id,
+                "bearing": bearing,
+                "distance": round(distance, 2),
+                "timestamp": cols.timestamps[row]
+            }
+            for row, image_id, bearing, distance in zip(
+                rows.tolist(), cols.ids[rows].tolist(), bearings[hits].tolist(), distances[hits].tolist()
+            )
+        ]
         
         return {"nearby_images": nearby}
     
@@ -283,6 +544,71 @@ def get_nearby_images(
         raise HTTPException(status_code=500, detail=f"Error finding nearby images: {str(e)}")
 
 
+@functools.lru_cache(maxsize=2048)
+def _compute_hotspots(generation: int, image_cols: ImageColumns, cols: FeatureColumns,
+                      image_id: int, feature_ids: tuple[int, ...]) -> tuple[dict, ...]:
+    """
+    Hotspots for the given features as seen from one image. Pure in the
+    (immutable) campaign data, so results are memoized per viewpoint and
+    sorted feature-ID tuple. The generation and both column sets come from
+    one load (columns hash by identity), so a reload can neither serve results
+    computed on the previous data nor mix two loads in one call.
+    """
+    image_row = image_cols.row_of[image_id]
+    
+    # Camera position (radians, with cached sin/cos of latitude)
+    cam_elev = image_cols.elev[image_row]
+    lat1 = image_cols.lat_rad[image_row]
+    sin_lat1, cos_lat1 = image_cols.sin_lat[image_row], image_cols.cos_lat[image_row]
+    
+    # Requested feature rows, in campaign order
+    rows = np.flatnonzero(np.isin(cols.ids, np.array(feature_ids, dtype=np.int64)))
+    
+    # Bounding-box prefilter so the trig below only runs on features that
+    # can be in range. The great-circle distance is at least R * |dlat|, and
+    # haversine gives sin²(d/2R) >= cos(lat1) cos(lat2) sin²(dlon/2), with
+    # cos(lat2) bounded below inside the latitude band.
+    band = MAX_HOTSPOT_DISTANCE / 6371000 * (1 + 1e-9)  # margin for float rounding
+    min_cos_lat2 = math.cos(min(abs(lat1) + band, math.pi / 2))
+    ratio = math.sin(band / 2) / math.sqrt(cos_lat1 * min_cos_lat2) if cos_lat1 * min_cos_lat2 > 0 else math.inf
+    lon_band = 2 * math.asin(ratio) if ratio < 1 else math.pi
+    dlon_wrapped = (cols.lon_rad[rows] - image_cols.lon_rad[image_row] + math.pi) % (2 * math.pi) - math.pi
+    rows = rows[(np.abs(cols.lat_rad[rows] - lat1) <= band) & (np.abs(dlon_wrapped) <= lon_band)]
+    
+    # Bearing (azimuth, 0-360) and haversine distance from camera to every
+    # requested feature
+    azimuths, distances = _bearings_and_distances(
+        lat1, image_cols.lon_rad[image_row], sin_lat1, cos_lat1,
+        cols.lat_rad[rows], cols.lon_rad[rows], cols.sin_lat[rows], cols.cos_lat[rows],
+    )
+    
+    # Elevation angle plus the per-type adjustment
+    elevation_angles = np.degrees(np.arctan2(cols.elev[rows] - cam_elev, distances))
+    elevation_angles += ELEVATION_OFFSETS[cols.type_codes[rows]]
+    
+    # Skip features that are too far (e.g., > 100m)
+    keep = distances <= MAX_HOTSPOT_DISTANCE
+    kept = rows[keep]
+    
+    hotspots = []
+    for feature_id, type_code, azimuth, elevation_angle, distance, confidence, condition_code in zip(
+        cols.ids[kept].tolist(), cols.type_codes[kept].tolist(), azimuths[keep].tolist(),
+        elevation_angles[keep].tolist(), distances[keep].tolist(), cols.confidence[kept].tolist(),
+        cols.condition_codes[kept].tolist()
+    ):
+        hotspots.append({
+            "feature_id": feature_id,
+            "feature_type": FEATURE_TYPES[type_code],
+            "hlookat": azimuth,  # Krpano horizontal angle (0-360)
+            "vlookat": elevation_angle,  # Krpano vertical angle (-90 to 90)
+            "distance": round(distance, 2),
+            "confidence": confidence,
+            "condition": FEATURE_CONDITIONS[condition_code]
+        })
+    
+    return tuple(hotspots)
+
+
 @app.get("/project/features")
 def project_features(
     image_id: int,
@@ -293,106 +619,36 @@ def project_features(
     Returns hotspot data (azimuth, elevation) for each feature.
     """
     try:
-        campaign = agent.campaign
+        # One snapshot for the lookup and the projection, even if a reload happens meanwhile
+        generation, image_cols, cols = MappingService.get_columns()
         
         # Find the image
-        image = None
-        for img in campaign.images:
-            if img.id == image_id:
-                image = img
-                break
-        
-        if not image:
+        if image_id not in image_cols.row_of:
             raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
         
         # Parse feature IDs
         if not feature_ids:
             return {"hotspots": []}
         
-        feature_id_list = [int(fid.strip()) for fid in feature_ids.split(",") if fid.strip()]
+        feature_id_key = tuple(sorted({int(fid) for fid in feature_ids.split(",") if fid.strip()}))
         
-        # Camera position (WGS84)
-        cam_coords = image.geometry['coordinates']
-        cam_lon = cam_coords[0]
-        cam_lat = cam_coords[1]
-        cam_elev = cam_coords[2] if len(cam_coords) > 2 else 0
-        
-        hotspots = []
-        
-        # Find requested features
-        for feature in campaign.features:
-            if feature.id not in feature_id_list:
-                continue
-            
-            # Feature position (WGS84)
-            feat_coords = feature.geometry['coordinates']
-            feat_lon = feat_coords[0]
-            feat_lat = feat_coords[1]
-            feat_elev = feat_coords[2] if len(feat_coords) > 2 else 0
-            
-            # Calculate bearing (azimuth) from camera to feature
-            dlon = math.radians(feat_lon - cam_lon)
-            lat1 = math.radians(cam_lat)
-            lat2 = math.radians(feat_lat)
-            
-            y = math.sin(dlon) * math.cos(lat2)
-            x = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
-            azimuth = math.degrees(math.atan2(y, x))
-            
-            # Normalize azimuth to 0-360
-            azimuth = (azimuth + 360) % 360
-            
-            # Calculate distance (haversine formula)
-            dlat = lat2 - lat1
-            a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-            c = 2 * math.asin(math.sqrt(a))
-            distance = 6371000 * c  # Earth radius in meters
-            
-            # Calculate elevation angle with feature-type adjustments
-            delev = feat_elev - cam_elev
-            base_elevation_angle = math.degrees(math.atan2(delev, distance))
-            
-            # Adjust elevation based on feature type (camera is ~1.5m high)
-            # Horizontal features: on the ground, look down
-            # Vertical features: at various heights, look straight or up
-            if feature.type in ['pavement_damage', 'pavement_patch', 'road_marking', 
-                                'crosswalk', 'manhole_cover', 'drainage_grate']:
-                # Horizontal features: assume on ground, look down (-10 to -30 degrees)
-                elevation_angle = base_elevation_angle - 15  # Look down at ground
-            elif feature.type in ['traffic_sign', 'stop_sign', 'speed_limit']:
-                # Signs: typically 2-3m high, slight upward angle
-                elevation_angle = base_elevation_angle + 5
-            elif feature.type in ['traffic_light', 'street_light']:
-                # Lights: high up, look up more
-                elevation_angle = base_elevation_angle + 15
-            elif feature.type in ['utility_pole', 'fire_hydrant', 'trash_bin']:
-                # Mid-height objects, roughly eye level
-                elevation_angle = base_elevation_angle
-            else:
-                # Default: use calculated angle
-                elevation_angle = base_elevation_angle
-            
-            # Skip if feature is too far (e.g., > 100m)
-            if distance > 100:
-                continue
-            
-            hotspots.append({
-                "feature_id": feature.id,
-                "feature_type": feature.type,
-                "hlookat": azimuth,  # Krpano horizontal angle (0-360)
-                "vlookat": elevation_angle,  # Krpano vertical angle (-90 to 90)
-                "distance": round(distance, 2),
-                "confidence": feature.confidence,
-                "condition": feature.condition
-            })
-        
-        return {"hotspots": hotspots}
+        return {"hotspots": list(_compute_hotspots(generation, image_cols, cols, image_id, feature_id_key))}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error projecting features: {str(e)}")
 
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # "auto" picks uvloop + httptools (from uvicorn[standard]) when installed, and
+    # falls back to asyncio/h11 where they aren't (uvloop doesn't exist on Windows).
+    # Sessions, caches and the COG reader pool are per process, so extra workers
+    # (UVICORN_WORKERS) only suit stateless tile/image traffic or a sticky-session proxy in front
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("UVICORN_WORKERS", "1")),
+        loop="auto",
+        http="auto",
+    )
 
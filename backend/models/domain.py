@@ -1,25 +1,87 @@
 """
 Core domain models for mobile mapping data
 """
-from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from dataclasses import dataclass
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, SkipValidation, computed_field
+from typing import Optional, Literal, get_args
 from datetime import datetime
+import re
+import numpy as np
 
 
-class Feature(BaseModel):
+FeatureType = Literal[
+    # Horizontal features
+    "pavement_damage", "road_marking", "manhole_cover", "drainage_grate", "pavement_patch",
+    # Vertical features  
+    "traffic_sign", "street_light", "utility_pole", "trash_bin", "fire_hydrant", 
+    "traffic_light", "vegetation"
+]
+FEATURE_TYPES: tuple[str, ...] = get_args(FeatureType)
+
+FeatureCondition = Literal["good", "fair", "poor", "damaged"]
+FEATURE_CONDITIONS: tuple[str, ...] = get_args(FeatureCondition)
+
+# A UTC offset ("Z", "+02:00", "-0500", ...) after the time part of an ISO 8601 timestamp
+_UTC_OFFSET = re.compile(r"[T ]\d.*(?:Z|[+-]\d\d(?::?\d\d)?)$")
+
+
+class PackedPoint(BaseModel):
+    """A model whose point lives in a row of a campaign-wide coordinate array.
+    
+    The GeoJSON geometry is only built when asked for (e.g. when serializing
+    /campaign), instead of keeping a dict + list per instance.
+    """
+    _points: np.ndarray = PrivateAttr()  # (N, 2) lon/lat or (N, 3) with NaN for no Z
+    _row: int = PrivateAttr()
+    
+    @property
+    def coordinates(self) -> tuple[float, ...]:
+        coords: list[float] = self._points[self._row].tolist()
+        if len(coords) == 3 and coords[2] != coords[2]:  # NaN elevation: 2D point
+            del coords[2]
+        return tuple(coords)
+    
+    @computed_field
+    @property
+    def geometry(self) -> dict:  # GeoJSON point
+        return {"type": "Point", "coordinates": list(self.coordinates)}
+
+
+def pack_points(models: list[PackedPoint], coordinates: list[tuple[float, ...]], dims: int) -> np.ndarray:
+    """Pack per-model coordinates into one (N, dims) array and bind each model to its row"""
+    points = np.full((len(coordinates), dims), np.nan, dtype=np.float64)
+    for row, coords in enumerate(coordinates):
+        points[row, :len(coords)] = coords[:dims]
+    for row, model in enumerate(models):
+        model._points = points
+        model._row = row
+    return points
+
+
+def pack_timestamps(images: list["ImagePosition"], timestamps: list[str]) -> np.ndarray:
+    """Parse ISO 8601 timestamps in one NumPy pass and bind each image to the shared array.
+    
+    NumPy would silently shift offset-bearing timestamps to naive UTC, so if any
+    carries an offset they are parsed with fromisoformat instead and kept aware.
+    """
+    if any(map(_UTC_OFFSET.search, timestamps)):
+        packed = np.array([datetime.fromisoformat(ts) for ts in timestamps], dtype=object)
+    else:
+        packed = np.array(timestamps, dtype="datetime64[us]")
+    for image in images:
+        image._timestamps = packed
+    return packed
+
+
+class Feature(PackedPoint):
     """A detected object in the campaign (sign, marking, guardrail, etc.)"""
     id: int
-    type: Literal[
-        # Horizontal features
-        "pavement_damage", "road_marking", "manhole_cover", "drainage_grate", "pavement_patch",
-        # Vertical features  
-        "traffic_sign", "street_light", "utility_pole", "trash_bin", "fire_hydrant", 
-        "traffic_light", "vegetation"
-    ]
-    condition: Literal["good", "fair", "poor", "damaged"]
+    type: FeatureType
+    condition: FeatureCondition
     confidence: float = 0.85  # Detection confidence (0-1)
-    geometry: dict  # GeoJSON point
-    attributes: dict  # Type-specific attributes
+    # Type-specific attributes. Not revalidated, so the dict the loader parsed is
+    # kept as-is instead of copied per feature.
+    attributes: SkipValidation[dict]
     image_ids: list[int]  # Images where this feature appears
     
     @property
@@ -27,22 +89,32 @@ class Feature(BaseModel):
         return f"{self.type.replace('_', ' ').title()} #{self.id}"
 
 
-class ImagePosition(BaseModel):
+class ImagePosition(PackedPoint):
     """A camera position in the campaign"""
     id: int
-    timestamp: datetime
     camera_id: str
-    geometry: dict  # GeoJSON point (lon, lat)
     heading: float  # degrees
     feature_ids: list[int]  # Visible features from this position
+    _timestamps: np.ndarray = PrivateAttr()  # campaign-wide datetime64[us] (or aware datetimes), indexed by _row
+    
+    @computed_field
+    @property
+    def timestamp(self) -> datetime:
+        return self._timestamps.item(self._row)
 
 
 class Campaign(BaseModel):
     """A mobile mapping campaign"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    
     id: str
     name: str
     features: list[Feature]
     images: list[ImagePosition]
+    # Packed point arrays backing each model's geometry (see pack_points); not serialized
+    features_xyz: np.ndarray = Field(exclude=True)  # (N, 3) float64, NaN elevation when 2D
+    images_xy: np.ndarray = Field(exclude=True)  # (N, 2) float64
+    image_timestamps: np.ndarray = Field(exclude=True)  # (N,) datetime64[us], or aware datetimes (object)
     
     @property
     def total_features(self) -> int:
@@ -52,3 +124,75 @@ class Campaign(BaseModel):
     def total_images(self) -> int:
         return len(self.images)
 
+
+# eq=False: columns are compared and hashed by identity, so one load's
+# columns can be part of a memo key
+
+@dataclass(slots=True, frozen=True, eq=False)
+class FeatureColumns:
+    """Columnar (SoA) arrays over the features, row-aligned with campaign.features"""
+    ids: np.ndarray  # int64
+    lon_rad: np.ndarray  # float64
+    lat_rad: np.ndarray  # float64
+    sin_lat: np.ndarray  # float64
+    cos_lat: np.ndarray  # float64
+    elev: np.ndarray  # float64 meters, 0 when the geometry has no Z
+    type_codes: np.ndarray  # int8 index into FEATURE_TYPES
+    condition_codes: np.ndarray  # int8 index into FEATURE_CONDITIONS
+    confidence: np.ndarray  # float64
+    
+    @classmethod
+    def from_campaign(cls, campaign: Campaign) -> "FeatureColumns":
+        features = campaign.features
+        code_of = {t: i for i, t in enumerate(FEATURE_TYPES)}
+        condition_code_of = {c: i for i, c in enumerate(FEATURE_CONDITIONS)}
+        coords = campaign.features_xyz
+        lat_rad = np.radians(coords[:, 1])
+        return cls(
+            ids=np.fromiter((f.id for f in features), dtype=np.int64, count=len(features)),
+            lon_rad=np.radians(coords[:, 0]),
+            lat_rad=lat_rad,
+            sin_lat=np.sin(lat_rad),
+            cos_lat=np.cos(lat_rad),
+            elev=np.nan_to_num(coords[:, 2], nan=0.0),
+            type_codes=np.fromiter((code_of[f.type] for f in features), dtype=np.int8, count=len(features)),
+            condition_codes=np.fromiter((condition_code_of[f.condition] for f in features), dtype=np.int8, count=len(features)),
+            confidence=np.fromiter((f.confidence for f in features), dtype=np.float64, count=len(features))
+        )
+
+
+@dataclass(slots=True, frozen=True, eq=False)
+class ImageColumns:
+    """Columnar (SoA) arrays over the images, row-aligned with campaign.images"""
+    ids: np.ndarray  # int64
+    lon_rad: np.ndarray  # float64
+    lat_rad: np.ndarray  # float64
+    sin_lat: np.ndarray  # float64
+    cos_lat: np.ndarray  # float64
+    elev: np.ndarray  # float64 meters, 0 when the geometry has no Z
+    timestamps: tuple[str, ...]  # ISO 8601, as served by the API
+    row_of: dict[int, int]  # image id -> row (first occurrence)
+    lat_order: np.ndarray  # rows sorted by latitude, for radius prefiltering
+    sorted_lat_rad: np.ndarray  # lat_rad[lat_order]
+    
+    @classmethod
+    def from_campaign(cls, campaign: Campaign) -> "ImageColumns":
+        images = campaign.images
+        coords = campaign.images_xy
+        lat_rad = np.radians(coords[:, 1])
+        row_of: dict[int, int] = {}
+        for row, img in enumerate(images):
+            row_of.setdefault(img.id, row)
+        lat_order = np.argsort(lat_rad, kind="stable")
+        return cls(
+            ids=np.fromiter((img.id for img in images), dtype=np.int64, count=len(images)),
+            lon_rad=np.radians(coords[:, 0]),
+            lat_rad=lat_rad,
+            sin_lat=np.sin(lat_rad),
+            cos_lat=np.cos(lat_rad),
+            elev=np.zeros(len(images), dtype=np.float64),  # image positions are 2D
+            timestamps=tuple(img.timestamp.isoformat() for img in images),
+            row_of=row_of,
+            lat_order=lat_order,
+            sorted_lat_rad=lat_rad[lat_order]
+        )
@@ -2,11 +2,14 @@
 Convert GeoPackage imagery positions to JSON metadata
 and create symlinks for images
 """
-import json
-import geopandas as gpd
+import numpy as np
+import orjson
+import pyogrio
+from pyproj import Transformer
 from pathlib import Path
 from datetime import datetime
 import os
+from symlink_utils import create_symlinks, run_chunked
 
 GPKG_PATH = Path("/home/marco/Repos/cyclomedia/detekt-product/detekt-test/mockup_data/track_2020/US-SANB-201020.gpkg")
 OUTPUT_JSON = Path("/home/marco/Repos/cyclomedia/detekt-product/detekt-test/mockup_data/track_2020/image_metadata.json")
@@ -28,59 +31,69 @@ def convert_geopackage_to_json():
     print("Converting GeoPackage to JSON Metadata")
     print("=" * 80)
     
-    # Read the GeoPackage
+    # Read the GeoPackage as plain columns (no GeoDataFrame, no per-row
+    # shapely geometries); the UTM position is in the x/y fields
     print(f"\n📦 Reading GeoPackage: {GPKG_PATH}")
-    gdf = gpd.read_file(GPKG_PATH, layer='imagery_positions')
-    print(f"✓ Loaded {len(gdf)} image positions")
-    
-    # Convert from UTM (EPSG:32611) to WGS84 (EPSG:4326) for lat/lon
-    print(f"\n🌍 Converting coordinates from {gdf.crs} to EPSG:4326 (WGS84)")
-    gdf_wgs84 = gdf.to_crs('EPSG:4326')
+    meta, _, _, field_data = pyogrio.raw.read(GPKG_PATH, layer='imagery_positions', read_geometry=False)
+    fields = dict(zip(meta['fields'], field_data))
+    total = len(fields['x'])
+    print(f"✓ Loaded {total} image positions")
+    
+    # Convert from UTM (EPSG:32611) to WGS84 (EPSG:4326) for lat/lon, in one call
+    print(f"\n🌍 Converting coordinates from {meta['crs']} to EPSG:4326 (WGS84)")
+    transformer = Transformer.from_crs(meta['crs'], 'EPSG:4326', always_xy=True)
+    lons, lats = transformer.transform(fields['x'], fields['y'])
     print(f"✓ Converted to lat/lon coordinates")
     
     # Create output structure
     image_positions = []
     
-    print(f"\n🔄 Processing {len(gdf_wgs84)} positions...")
-    for idx, row in gdf_wgs84.iterrows():
-        # Get lon, lat from geometry
-        lon = row.geometry.x
-        lat = row.geometry.y
-        elevation = row['z']
-        
+    print(f"\n🔄 Processing {total} positions...")
+    # Cast each column once with NumPy; tolist() then yields plain Python
+    # ints/floats, so no per-field int()/float() in the loop
+    timestamps_ms = fields['timestamp'].astype(np.int64)
+    columns = zip(
+        lons.astype(np.float64).tolist(), lats.astype(np.float64).tolist(),
+        fields['z'].astype(np.float64).tolist(), (timestamps_ms / 1000.0).tolist(), timestamps_ms.tolist(),
+        fields['image_path'].tolist(), fields['frame'].astype(np.int64).tolist(), fields['camera_name'].tolist(),
+        fields['camera_model'].tolist(), fields['width'].astype(np.int64).tolist(), fields['height'].astype(np.int64).tolist(),
+        fields['track_name'].tolist(), fields['dataset_name'].tolist(),
+        fields['x'].astype(np.float64).tolist(), fields['y'].astype(np.float64).tolist()
+    )
+    for idx, (lon, lat, elevation, timestamp_s, timestamp_ms, image_path, frame, camera_name, camera_model,
+              width, height, track_name, dataset_name, utm_x, utm_y) in enumerate(columns):
         # Convert timestamp from milliseconds to ISO format
-        timestamp_ms = row['timestamp']
-        timestamp_dt = datetime.fromtimestamp(timestamp_ms / 1000.0)
+        timestamp_dt = datetime.fromtimestamp(timestamp_s)
         
         # Create image position object
         position = {
-            "id": int(idx),
-            "image_path": row['image_path'],
-            "frame": int(row['frame']),
+            "id": idx,
+            "image_path": image_path,
+            "frame": frame,
             "timestamp": timestamp_dt.isoformat(),
-            "timestamp_ms": int(timestamp_ms),
+            "timestamp_ms": timestamp_ms,
             
             # Position (WGS84)
-            "longitude": float(lon),
-            "latitude": float(lat),
-            "elevation": float(elevation),
+            "longitude": lon,
+            "latitude": lat,
+            "elevation": elevation,
             
             # Camera info
-            "camera_name": row['camera_name'],
-            "camera_model": row['camera_model'],
+            "camera_name": camera_name,
+            "camera_model": camera_model,
             "camera_type": "360_spherical",  # Ladybug 8 is 360° camera
             
             # Image properties
-            "width": int(row['width']),
-            "height": int(row['height']),
+            "width": width,
+            "height": height,
             
             # Recording info
-            "track_name": row['track_name'],
-            "dataset_name": row['dataset_name'],
+            "track_name": track_name,
+            "dataset_name": dataset_name,
             
             # UTM coordinates (keep for reference)
-            "utm_x": float(row['x']),
-            "utm_y": float(row['y']),
+            "utm_x": utm_x,
+            "utm_y": utm_y,
             "utm_zone": "11N",
             "crs": "EPSG:32611"
         }
@@ -88,7 +101,7 @@ def convert_geopackage_to_json():
         image_positions.append(position)
         
         if (idx + 1) % 5000 == 0:
-            print(f"  Processed {idx + 1}/{len(gdf_wgs84)}...")
+            print(f"  Processed {idx + 1}/{total}...")
     
     # Create metadata structure
     metadata = {
@@ -98,32 +111,31 @@ def convert_geopackage_to_json():
             "description": "Mobile mapping campaign in San Bernardino, California",
             "location": "San Bernardino, CA, USA",
             "date": "2020-10-20",
-            "track_name": gdf.iloc[0]['track_name'],
-            "dataset_name": gdf.iloc[0]['dataset_name']
+            "track_name": fields['track_name'][0],
+            "dataset_name": fields['dataset_name'][0]
         },
         "bounds": {
-            "min_lon": float(gdf_wgs84.total_bounds[0]),
-            "min_lat": float(gdf_wgs84.total_bounds[1]),
-            "max_lon": float(gdf_wgs84.total_bounds[2]),
-            "max_lat": float(gdf_wgs84.total_bounds[3]),
-            "center_lon": float((gdf_wgs84.total_bounds[0] + gdf_wgs84.total_bounds[2]) / 2),
-            "center_lat": float((gdf_wgs84.total_bounds[1] + gdf_wgs84.total_bounds[3]) / 2)
+            "min_lon": float(lons.min()),
+            "min_lat": float(lats.min()),
+            "max_lon": float(lons.max()),
+            "max_lat": float(lats.max()),
+            "center_lon": float((lons.min() + lons.max()) / 2),
+            "center_lat": float((lats.min() + lats.max()) / 2)
         },
         "camera": {
-            "model": gdf.iloc[0]['camera_model'],
+            "model": fields['camera_model'][0],
             "type": "360_spherical",
-            "width": int(gdf.iloc[0]['width']),
-            "height": int(gdf.iloc[0]['height'])
+            "width": int(fields['width'][0]),
+            "height": int(fields['height'][0])
         },
         "total_images": len(image_positions),
         "image_positions": image_positions
     }
     
-    # Save to JSON
+    # Save to JSON (orjson serializes in C, same indent=2 layout)
     print(f"\n💾 Saving metadata to: {OUTPUT_JSON}")
     OUTPUT_JSON.parent.mkdir(parents=True, exist_ok=True)
-    with open(OUTPUT_JSON, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    OUTPUT_JSON.write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
     
     print(f"✅ Metadata saved! ({len(image_positions)} positions)")
     
@@ -166,28 +178,26 @@ def create_image_symlinks(metadata):
     
     # Create symlinks
     print(f"\n🔗 Creating symlinks for {metadata['total_images']} images...")
-    created = 0
-    skipped = 0
-    
+    # Build all (relative source, target) pairs up front: each parent dir is
+    # created once and relpath is computed once per (source, parent)
+    tasks = []
+    relative_sources = {}
     for position in metadata['image_positions']:
         # Target symlink path (e.g., images/spherical/0.jpg)
         target_path = IMAGES_DIR / position['image_path']
-        target_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Cycle through source images
         source_image = available_sources[position['id'] % len(available_sources)]
         
-        # Create symlink
-        if target_path.exists() or target_path.is_symlink():
-            skipped += 1
-        else:
-            # Create relative symlink
-            relative_source = os.path.relpath(source_image, target_path.parent)
-            os.symlink(relative_source, target_path)
-            created += 1
-        
-        if (created + skipped) % 5000 == 0:
-            print(f"  Progress: {created + skipped}/{metadata['total_images']}...")
+        key = (source_image, target_path.parent)
+        if key not in relative_sources:
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+            relative_sources[key] = os.path.relpath(source_image, target_path.parent)
+        tasks.append((relative_sources[key], str(target_path)))
+    
+    # Create relative symlinks in parallel; existing targets are skipped
+    created = run_chunked(create_symlinks, tasks, len(tasks))
+    skipped = len(tasks) - created
     
     print(f"\n✅ Symlinks created!")
     print(f"  - Created: {created}")
@@ -1,10 +1,17 @@
 """
 Generate mock features (horizontal and vertical) for the San Bernardino campaign
 """
-import json
-import random
+import math
+import os
+import ijson
+import orjson
+import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from heapq import merge
+from itertools import islice, repeat
+from collections import Counter, defaultdict
 
 BASE_DIR = Path("/home/marco/Repos/cyclomedia/detekt-product/detekt-test/mockup_data/track_2020")
 METADATA_FILE = BASE_DIR / "data" / "image_metadata.json"
@@ -12,6 +19,11 @@ FEATURES_DIR = BASE_DIR / "data" / "features"
 HORIZONTAL_DIR = FEATURES_DIR / "horizontal"
 VERTICAL_DIR = FEATURES_DIR / "vertical"
 
+# Max distance (degrees) at which an image counts as seeing a feature; also the grid cell size
+VISIBILITY_DISTANCE = 0.0005
+MAX_IMAGES_PER_FEATURE = 10
+_NEIGHBOUR_CELLS = tuple((dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+
 # Feature type definitions
 HORIZONTAL_TYPES = {
     "pavement_damage": {
@@ -79,38 +91,303 @@ VERTICAL_TYPES = {
     }
 }
 
+# Discrete domains of the type-specific extra attributes, drawn as one column per attribute
+EXTRA_CHOICES = {
+    "road_marking": {"width_cm": [10, 15, 20, 30], "color": ["white", "yellow"]},
+    "manhole_cover": {"diameter_cm": [60, 80, 100], "utility_type": ["sewer", "storm_drain", "telecom", "electric"]},
+    "drainage_grate": {"width_cm": range(30, 61), "length_cm": range(60, 121)},
+    "traffic_sign": {"speed_limit_mph": [25, 35, 45, 55, 65]},
+    "street_light": {"power_watts": [100, 150, 250, 400], "maintenance_age_days": range(30, 366)},
+    "utility_pole": {"pole_number": range(1000, 10000), "has_transformer": [True, False]},
+    "fire_hydrant": {
+        "inspection_age_days": range(90, 731), "flow_gpm": [1000, 1500, 2000, 2500], "color": ["red", "yellow", "orange"]
+    },
+    "traffic_light": {"num_heads": [1, 2, 3, 4], "has_camera": [True, False]},
+}
+
+# Continuous extra attributes as (low, high, decimals), drawn and rounded as one column each
+EXTRA_MEASUREMENTS = {
+    "pavement_damage": {"area_m2": (0.1, 2.5, 2)},
+    "pavement_patch": {"area_m2": (1.0, 10.0, 2)},
+    "traffic_sign": {"retroreflectivity": (50, 300, 1)},
+}
+VERTICAL_HEIGHT_M = (1.5, 8.0, 2)  # Common to every vertical type
+
 
-def load_campaign_bounds():
-    """Load campaign metadata to get bounds"""
+def load_campaign_bounds(sample_step=10):
+    """Stream campaign metadata to get bounds and every `sample_step`-th image position"""
     print(f"📄 Loading campaign bounds from: {METADATA_FILE}")
-    with open(METADATA_FILE, 'r') as f:
-        metadata = json.load(f)
+    with open(METADATA_FILE, 'rb') as f:
+        # bounds sits near the top of the file, so this stops early
+        bounds = next(ijson.items(f, 'bounds', use_float=True))
+        print(f"✓ Campaign bounds: ({bounds['min_lon']:.6f}, {bounds['min_lat']:.6f}) to ({bounds['max_lon']:.6f}, {bounds['max_lat']:.6f})")
+        
+        # Only the sampled positions are ever materialized
+        f.seek(0)
+        positions = ijson.items(f, 'image_positions.item', use_float=True)
+        sampled_images = list(islice(positions, 0, None, sample_step))
+    
+    return bounds, sampled_images
+
+
+def generate_random_points(rng, bounds, count):
+    """Generate `count` random points within bounds in one draw per axis"""
+    lons = rng.uniform(bounds['min_lon'], bounds['max_lon'], count).tolist()
+    lats = rng.uniform(bounds['min_lat'], bounds['max_lat'], count).tolist()
+    elevations = rng.uniform(280, 300, count).tolist()  # Approximate elevation for San Bernardino
+    return lons, lats, elevations
+
+
+def draw_choices(rng, values, count):
+    """Pick `count` items from `values` with a single index draw"""
+    return [values[i] for i in rng.integers(0, len(values), count)]
+
+
+def draw_measurements(rng, spec, count):
+    """Draw `count` uniform values from a (low, high, decimals) spec, rounded in one NumPy call"""
+    low, high, decimals = spec
+    return np.round(rng.uniform(low, high, count), decimals).tolist()
+
+
+def draw_base_columns(rng, bounds, feature_type, config, confidence_range, detectors):
+    """Draw every per-feature random column of one feature type up front"""
+    count = config['count']
+    lons, lats, elevations = generate_random_points(rng, bounds, count)
+    return {
+        "lon": lons,
+        "lat": lats,
+        "elevation": elevations,
+        "days": rng.integers(0, 31, count).tolist(),
+        "confidence": rng.uniform(*confidence_range, count).round(3).tolist(),
+        "detected_by": draw_choices(rng, detectors, count),
+        "enums": {
+            key: draw_choices(rng, values, count)
+            for key, values in config.items()
+            if key != 'count' and isinstance(values, list)
+        },
+        "extras": {
+            key: draw_choices(rng, values, count)
+            for key, values in EXTRA_CHOICES.get(feature_type, {}).items()
+        } | {
+            key: draw_measurements(rng, spec, count)
+            for key, spec in EXTRA_MEASUREMENTS.get(feature_type, {}).items()
+        },
+    }
+
+
+def image_position_arrays(image_positions, cell_size=VISIBILITY_DISTANCE):
+    """Build the grid-bucket index of image positions from parallel lon/lat/id arrays, once per run"""
+    n = len(image_positions)
+    lons = np.fromiter((img['longitude'] for img in image_positions), np.float64, count=n)
+    lats = np.fromiter((img['latitude'] for img in image_positions), np.float64, count=n)
+    ids = np.fromiter((img['id'] for img in image_positions), np.int64, count=n)
     
-    bounds = metadata['bounds']
-    print(f"✓ Campaign bounds: ({bounds['min_lon']:.6f}, {bounds['min_lat']:.6f}) to ({bounds['max_lon']:.6f}, {bounds['max_lat']:.6f})")
+    # Bucket images by (lon, lat) cell. Each bucket holds plain (index, lon, lat, id) tuples in
+    # image order: a query only touches a handful of them, where a tight Python loop beats
+    # per-call NumPy dispatch
+    cell_x = np.floor(lons / cell_size).astype(np.int64).tolist()
+    cell_y = np.floor(lats / cell_size).astype(np.int64).tolist()
+    grid = defaultdict(list)
+    for idx, (img_lon, img_lat, img_id) in enumerate(zip(lons.tolist(), lats.tolist(), ids.tolist())):
+        grid[(cell_x[idx], cell_y[idx])].append((idx, img_lon, img_lat, img_id))
     
-    return bounds, metadata['image_positions']
+    return dict(grid), cell_size
 
 
-def generate_random_point(bounds):
-    """Generate a random point within bounds"""
-    lon = random.uniform(bounds['min_lon'], bounds['max_lon'])
-    lat = random.uniform(bounds['min_lat'], bounds['max_lat'])
-    elevation = random.uniform(280, 300)  # Approximate elevation for San Bernardino
-    return lon, lat, elevation
+def find_nearby_images(lon, lat, image_coords, max_distance=VISIBILITY_DISTANCE):
+    """Find images within distance of a point (rough distance in degrees).
+    
+    Deterministic: the first MAX_IMAGES_PER_FEATURE hits in image order, not a random
+    sample, so regenerated mock data is stable and the scan can stop at the last one.
+    """
+    grid, cell_size = image_coords
+    # Any image within max_distance (<= cell_size) lies in the point's cell or one of its 8 neighbours
+    cx, cy = math.floor(lon / cell_size), math.floor(lat / cell_size)
+    buckets = [grid[cell] for cell in ((cx + dx, cy + dy) for dx, dy in _NEIGHBOUR_CELLS) if cell in grid]
+    # Buckets are already in image order: merge them lazily so stopping at 10 hits skips the rest
+    candidates = merge(*buckets)
+    
+    r2 = max_distance * max_distance
+    hits = []
+    for _, img_lon, img_lat, img_id in candidates:
+        dx = img_lon - lon
+        dy = img_lat - lat
+        if dx * dx + dy * dy < r2:
+            hits.append(img_id)
+            # Max 10 images per feature: the first 10 in image order
+            if len(hits) == MAX_IMAGES_PER_FEATURE:
+                break
+    
+    return hits
 
 
-def find_nearby_images(lon, lat, image_positions, max_distance=0.0005):
-    """Find images within distance of a point (rough distance in degrees)"""
-    nearby = []
-    for img in image_positions:
-        dist = ((img['longitude'] - lon)**2 + (img['latitude'] - lat)**2)**0.5
-        if dist < max_distance:
-            nearby.append(img['id'])
-    return nearby[:10]  # Max 10 images per feature
+def generate_horizontal_type(feature_type, config, start_id, seed, bounds, image_coords, now):
+    """Generate and save the features of one horizontal type (runs in a worker process); returns the count"""
+    rng = np.random.default_rng(seed)
+    features = []
+    
+    cols = draw_base_columns(rng, bounds, feature_type, config, (0.75, 0.99), ["AI_VISION_v2.1", "AI_VISION_v2.0", "MANUAL"])
+    enums, extras = cols["enums"], cols["extras"]
+    
+    for i in range(config['count']):
+        lon, lat = cols["lon"][i], cols["lat"][i]
+        
+        # Base feature data
+        feature = {
+            "id": start_id + i,
+            "feature_type": feature_type,
+            "detection_type": "horizontal",
+            "timestamp": (now - timedelta(days=cols["days"][i])).isoformat(),
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat, cols["elevation"][i]]
+            },
+            "confidence": cols["confidence"][i],
+            "detected_by": cols["detected_by"][i],
+            "visible_in_images": find_nearby_images(lon, lat, image_coords)
+        }
+        
+        # Add type-specific attributes
+        attributes = {key: draws[i] for key, draws in enums.items()}
+        
+        # Add common attributes
+        if feature_type == "pavement_damage":
+            attributes["area_m2"] = extras["area_m2"][i]
+            attributes["requires_repair"] = attributes.get("severity", "minor") in ["moderate", "severe"]
+        
+        elif feature_type == "road_marking":
+            attributes["width_cm"] = extras["width_cm"][i]
+            attributes["color"] = extras["color"][i]
+        
+        elif feature_type == "manhole_cover":
+            attributes["diameter_cm"] = extras["diameter_cm"][i]
+            attributes["utility_type"] = extras["utility_type"][i]
+        
+        elif feature_type == "drainage_grate":
+            attributes["width_cm"] = extras["width_cm"][i]
+            attributes["length_cm"] = extras["length_cm"][i]
+        
+        elif feature_type == "pavement_patch":
+            attributes["area_m2"] = extras["area_m2"][i]
+        
+        feature["attributes"] = attributes
+        features.append(feature)
+    
+    # Save to JSON file
+    output_file = HORIZONTAL_DIR / f"{feature_type}.json"
+    output_file.write_bytes(orjson.dumps({
+        "feature_type": feature_type,
+        "detection_type": "horizontal",
+        "total_features": len(features),
+        "features": features
+    }, option=orjson.OPT_INDENT_2))
+    
+    return len(features)
 
 
-def generate_horizontal_features(bounds, image_positions):
+def generate_vertical_type(feature_type, config, start_id, seed, bounds, image_coords, now):
+    """Generate and save the features of one vertical type (runs in a worker process); returns the count"""
+    rng = np.random.default_rng(seed)
+    features = []
+    
+    cols = draw_base_columns(rng, bounds, feature_type, config, (0.80, 0.99), ["AI_VISION_v2.1", "AI_LIDAR_v1.5", "MANUAL"])
+    enums, extras = cols["enums"], cols["extras"]
+    heights = draw_measurements(rng, VERTICAL_HEIGHT_M, config['count'])
+    
+    for i in range(config['count']):
+        lon, lat = cols["lon"][i], cols["lat"][i]
+        
+        # Base feature data
+        feature = {
+            "id": start_id + i,
+            "feature_type": feature_type,
+            "detection_type": "vertical",
+            "timestamp": (now - timedelta(days=cols["days"][i])).isoformat(),
+            "geometry": {
+                "type": "Point",
+                "coordinates": [lon, lat, cols["elevation"][i]]
+            },
+            "confidence": cols["confidence"][i],
+            "detected_by": cols["detected_by"][i],
+            "visible_in_images": find_nearby_images(lon, lat, image_coords)
+        }
+        
+        # Add type-specific attributes
+        attributes = {key: draws[i] for key, draws in enums.items()}
+        
+        # Add common attributes
+        attributes["height_m"] = heights[i]
+        
+        if feature_type == "traffic_sign":
+            if attributes.get("subtypes") == "speed_limit":
+                attributes["speed_limit_mph"] = extras["speed_limit_mph"][i]
+            attributes["retroreflectivity"] = extras["retroreflectivity"][i]
+        
+        elif feature_type == "street_light":
+            attributes["power_watts"] = extras["power_watts"][i]
+            attributes["last_maintenance"] = (now - timedelta(days=extras["maintenance_age_days"][i])).isoformat()
+        
+        elif feature_type == "utility_pole":
+            attributes["pole_number"] = f"P{extras['pole_number'][i]}"
+            attributes["has_transformer"] = extras["has_transformer"][i]
+        
+        elif feature_type == "fire_hydrant":
+            attributes["last_inspection"] = (now - timedelta(days=extras["inspection_age_days"][i])).isoformat()
+            attributes["flow_gpm"] = extras["flow_gpm"][i]
+            attributes["color"] = extras["color"][i]
+        
+        elif feature_type == "traffic_light":
+            attributes["num_heads"] = extras["num_heads"][i]
+            attributes["has_camera"] = extras["has_camera"][i]
+        
+        elif feature_type == "vegetation":
+            attributes["requires_trimming"] = attributes.get("obstruction_level") in ["minor", "major"]
+        
+        feature["attributes"] = attributes
+        features.append(feature)
+    
+    # Save to JSON file
+    output_file = VERTICAL_DIR / f"{feature_type}.json"
+    output_file.write_bytes(orjson.dumps({
+        "feature_type": feature_type,
+        "detection_type": "vertical",
+        "total_features": len(features),
+        "features": features
+    }, option=orjson.OPT_INDENT_2))
+    
+    return len(features)
+
+
+def run_feature_types(executor, generate_type, feature_types, first_id, first_seed, bounds, image_coords, now):
+    """Generate every type of one detection class concurrently; returns feature counts by type"""
+    types = list(feature_types.items())
+    start_ids = []
+    next_id = first_id
+    for feature_type, config in types:
+        print(f"🔧 Generating {config['count']} {feature_type} features...")
+        start_ids.append(next_id)
+        next_id += config['count']
+    
+    results = executor.map(
+        generate_type,
+        [feature_type for feature_type, _ in types],
+        [config for _, config in types],
+        start_ids,
+        range(first_seed, first_seed + len(types)),
+        repeat(bounds),
+        repeat(image_coords),
+        repeat(now),
+    )
+    
+    counts = Counter()
+    for (feature_type, _), count in zip(types, results):
+        print(f"  ✓ Saved {count} features to {feature_type}.json")
+        counts[feature_type] += count
+    
+    return counts
+
+
+def generate_horizontal_features(executor, bounds, image_coords, now):
     """Generate horizontal (ground-level) features"""
     print("\n" + "="*80)
     print("Generating Horizontal Features")
@@ -118,78 +395,10 @@ def generate_horizontal_features(bounds, image_positions):
     
     HORIZONTAL_DIR.mkdir(parents=True, exist_ok=True)
     
-    all_features = []
-    feature_id = 0
-    
-    for feature_type, config in HORIZONTAL_TYPES.items():
-        print(f"\n🔧 Generating {config['count']} {feature_type} features...")
-        features = []
-        
-        for i in range(config['count']):
-            lon, lat, elevation = generate_random_point(bounds)
-            
-            # Base feature data
-            feature = {
-                "id": feature_id,
-                "feature_type": feature_type,
-                "detection_type": "horizontal",
-                "timestamp": (datetime.now() - timedelta(days=random.randint(0, 30))).isoformat(),
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat, elevation]
-                },
-                "confidence": round(random.uniform(0.75, 0.99), 3),
-                "detected_by": random.choice(["AI_VISION_v2.1", "AI_VISION_v2.0", "MANUAL"]),
-                "visible_in_images": find_nearby_images(lon, lat, image_positions)
-            }
-            
-            # Add type-specific attributes
-            attributes = {}
-            for key, values in config.items():
-                if key != 'count' and isinstance(values, list):
-                    attributes[key] = random.choice(values)
-            
-            # Add common attributes
-            if feature_type == "pavement_damage":
-                attributes["area_m2"] = round(random.uniform(0.1, 2.5), 2)
-                attributes["requires_repair"] = attributes.get("severity", "minor") in ["moderate", "severe"]
-            
-            elif feature_type == "road_marking":
-                attributes["width_cm"] = random.choice([10, 15, 20, 30])
-                attributes["color"] = random.choice(["white", "yellow"])
-            
-            elif feature_type == "manhole_cover":
-                attributes["diameter_cm"] = random.choice([60, 80, 100])
-                attributes["utility_type"] = random.choice(["sewer", "storm_drain", "telecom", "electric"])
-            
-            elif feature_type == "drainage_grate":
-                attributes["width_cm"] = random.randint(30, 60)
-                attributes["length_cm"] = random.randint(60, 120)
-            
-            elif feature_type == "pavement_patch":
-                attributes["area_m2"] = round(random.uniform(1.0, 10.0), 2)
-            
-            feature["attributes"] = attributes
-            features.append(feature)
-            all_features.append(feature)
-            feature_id += 1
-        
-        # Save to JSON file
-        output_file = HORIZONTAL_DIR / f"{feature_type}.json"
-        with open(output_file, 'w') as f:
-            json.dump({
-                "feature_type": feature_type,
-                "detection_type": "horizontal",
-                "total_features": len(features),
-                "features": features
-            }, f, indent=2)
-        
-        print(f"  ✓ Saved {len(features)} features to {output_file.name}")
-    
-    return all_features
+    return run_feature_types(executor, generate_horizontal_type, HORIZONTAL_TYPES, 0, 42, bounds, image_coords, now)
 
 
-def generate_vertical_features(bounds, image_positions):
+def generate_vertical_features(executor, bounds, image_coords, now):
     """Generate vertical (above-ground) features"""
     print("\n" + "="*80)
     print("Generating Vertical Features")
@@ -197,118 +406,37 @@ def generate_vertical_features(bounds, image_positions):
     
     VERTICAL_DIR.mkdir(parents=True, exist_ok=True)
     
-    all_features = []
-    feature_id = 10000  # Start vertical features at 10000
-    
-    for feature_type, config in VERTICAL_TYPES.items():
-        print(f"\n🔧 Generating {config['count']} {feature_type} features...")
-        features = []
-        
-        for i in range(config['count']):
-            lon, lat, elevation = generate_random_point(bounds)
-            
-            # Base feature data
-            feature = {
-                "id": feature_id,
-                "feature_type": feature_type,
-                "detection_type": "vertical",
-                "timestamp": (datetime.now() - timedelta(days=random.randint(0, 30))).isoformat(),
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [lon, lat, elevation]
-                },
-                "confidence": round(random.uniform(0.80, 0.99), 3),
-                "detected_by": random.choice(["AI_VISION_v2.1", "AI_LIDAR_v1.5", "MANUAL"]),
-                "visible_in_images": find_nearby_images(lon, lat, image_positions)
-            }
-            
-            # Add type-specific attributes
-            attributes = {}
-            for key, values in config.items():
-                if key != 'count' and isinstance(values, list):
-                    attributes[key] = random.choice(values)
-            
-            # Add common attributes
-            attributes["height_m"] = round(random.uniform(1.5, 8.0), 2)
-            
-            if feature_type == "traffic_sign":
-                if attributes.get("subtypes") == "speed_limit":
-                    attributes["speed_limit_mph"] = random.choice([25, 35, 45, 55, 65])
-                attributes["retroreflectivity"] = round(random.uniform(50, 300), 1)
-            
-            elif feature_type == "street_light":
-                attributes["power_watts"] = random.choice([100, 150, 250, 400])
-                attributes["last_maintenance"] = (datetime.now() - timedelta(days=random.randint(30, 365))).isoformat()
-            
-            elif feature_type == "utility_pole":
-                attributes["pole_number"] = f"P{random.randint(1000, 9999)}"
-                attributes["has_transformer"] = random.choice([True, False])
-            
-            elif feature_type == "fire_hydrant":
-                attributes["last_inspection"] = (datetime.now() - timedelta(days=random.randint(90, 730))).isoformat()
-                attributes["flow_gpm"] = random.choice([1000, 1500, 2000, 2500])
-                attributes["color"] = random.choice(["red", "yellow", "orange"])
-            
-            elif feature_type == "traffic_light":
-                attributes["num_heads"] = random.choice([1, 2, 3, 4])
-                attributes["has_camera"] = random.choice([True, False])
-            
-            elif feature_type == "vegetation":
-                attributes["requires_trimming"] = attributes.get("obstruction_level") in ["minor", "major"]
-            
-            feature["attributes"] = attributes
-            features.append(feature)
-            all_features.append(feature)
-            feature_id += 1
-        
-        # Save to JSON file
-        output_file = VERTICAL_DIR / f"{feature_type}.json"
-        with open(output_file, 'w') as f:
-            json.dump({
-                "feature_type": feature_type,
-                "detection_type": "vertical",
-                "total_features": len(features),
-                "features": features
-            }, f, indent=2)
-        
-        print(f"  ✓ Saved {len(features)} features to {output_file.name}")
-    
-    return all_features
+    # Start vertical features at 10000; seeds continue after the horizontal types
+    return run_feature_types(
+        executor, generate_vertical_type, VERTICAL_TYPES, 10000, 42 + len(HORIZONTAL_TYPES), bounds, image_coords, now
+    )
 
 
-def create_summary(horizontal_features, vertical_features):
-    """Create a summary of all features"""
+def create_summary(horizontal_counts, vertical_counts, now):
+    """Create a summary of all features from the per-type counts"""
     print("\n" + "="*80)
     print("Creating Feature Summary")
     print("="*80)
     
+    horizontal_total = horizontal_counts.total()
+    vertical_total = vertical_counts.total()
     summary = {
         "campaign_id": "US-SANB-201020",
-        "generated_at": datetime.now().isoformat(),
-        "total_features": len(horizontal_features) + len(vertical_features),
+        "generated_at": now.isoformat(),
+        "total_features": horizontal_total + vertical_total,
         "horizontal_features": {
-            "total": len(horizontal_features),
-            "by_type": {}
+            "total": horizontal_total,
+            "by_type": dict(horizontal_counts)
         },
         "vertical_features": {
-            "total": len(vertical_features),
-            "by_type": {}
+            "total": vertical_total,
+            "by_type": dict(vertical_counts)
         }
     }
     
-    # Count by type
-    for feature in horizontal_features:
-        ftype = feature['feature_type']
-        summary['horizontal_features']['by_type'][ftype] = summary['horizontal_features']['by_type'].get(ftype, 0) + 1
-    
-    for feature in vertical_features:
-        ftype = feature['feature_type']
-        summary['vertical_features']['by_type'][ftype] = summary['vertical_features']['by_type'].get(ftype, 0) + 1
-    
     # Save summary
     summary_file = FEATURES_DIR / "features_summary.json"
-    with open(summary_file, 'w') as f:
-        json.dump(summary, f, indent=2)
+    summary_file.write_bytes(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
     
     print(f"\n✓ Summary saved to: {summary_file}")
     print(f"\n📊 Feature Statistics:")
@@ -323,25 +451,27 @@ def create_summary(horizontal_features, vertical_features):
 
 def main():
     """Generate all mock features"""
-    random.seed(42)  # For reproducibility
-    
     print("="*80)
     print("Mock Feature Generator")
     print("="*80)
     
     # Load campaign bounds
-    bounds, image_positions = load_campaign_bounds()
-    
     # Sample image positions for faster processing (use every 10th)
-    sampled_images = image_positions[::10]
+    bounds, sampled_images = load_campaign_bounds(sample_step=10)
     print(f"✓ Using {len(sampled_images)} sampled image positions for visibility checks")
+    image_coords = image_position_arrays(sampled_images)
+    
+    # One "now" for the whole run: every timestamp and the summary are relative to it
+    now = datetime.now()
     
-    # Generate features
-    horizontal_features = generate_horizontal_features(bounds, sampled_images)
-    vertical_features = generate_vertical_features(bounds, sampled_images)
+    # Generate features, one worker process per feature type
+    # (each type seeds its own RNG from 42 + its index, for reproducibility)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        horizontal_counts = generate_horizontal_features(executor, bounds, image_coords, now)
+        vertical_counts = generate_vertical_features(executor, bounds, image_coords, now)
     
     # Create summary
-    create_summary(horizontal_features, vertical_features)
+    create_summary(horizontal_counts, vertical_counts, now)
     
     print("\n" + "="*80)
     print("✅ Feature Generation Complete!")
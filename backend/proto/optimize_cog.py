@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Rewrite the ortho as a Web Mercator aligned COG
+
+The source ortho is in its native projected CRS, so every /cog/tiles request
+warps on the fly. Re-gridding it once onto the GoogleMapsCompatible tile
+matrix (512px blocks + overviews) turns tile reads into aligned block reads.
+Uses GDAL's COG driver through rasterio, so no rio-cogeo needed.
+"""
+import sys
+from pathlib import Path
+
+import rasterio
+from rasterio.shutil import copy as rio_copy
+
+ORTHO_DIR = Path(__file__).parent.parent.parent / "mockup_data" / "track_2020" / "data" / "images" / "ortho"
+SOURCE = ORTHO_DIR / "san_bernardino_201020.tif"
+TARGET = ORTHO_DIR / "san_bernardino_201020_webopt.tif"  # Picked up by main.COG_PATH when present
+
+
+def optimize_cog(source: Path = SOURCE, target: Path = TARGET):
+    print(f"📄 Source: {source}")
+    with rasterio.open(source) as src:
+        print(f"  CRS: {src.crs}, size: {src.width}x{src.height}, bands: {src.count}, dtype: {src.dtypes[0]}")
+        # JPEG only supports 8-bit 1/3-band data (an alpha band becomes the mask)
+        compress = "JPEG" if src.dtypes[0] == "uint8" and src.count in (1, 3, 4) else "DEFLATE"
+
+    print(f"⚙️  Writing Web Mercator COG ({compress}, 512px blocks)...")
+    rio_copy(
+        str(source),
+        str(target),
+        driver="COG",
+        TILING_SCHEME="GoogleMapsCompatible",
+        BLOCKSIZE=512,
+        COMPRESS=compress,
+        QUALITY=85,
+        RESAMPLING="BILINEAR",
+        OVERVIEW_RESAMPLING="AVERAGE",
+        NUM_THREADS="ALL_CPUS",
+    )
+
+    with rasterio.open(target) as dst:
+        print(f"  CRS: {dst.crs}, size: {dst.width}x{dst.height}, blocks: {dst.block_shapes[0]}, overviews: {dst.overviews(1)}")
+    print(f"✅ Done! Wrote {target}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        optimize_cog(Path(sys.argv[1]), Path(sys.argv[2]))
+    else:
+        optimize_cog()
@@ -1,9 +1,10 @@
 """
 Recreate symlinks in the new structure
 """
-import json
+import ijson
 import os
 from pathlib import Path
+from symlink_utils import close_dir, open_dir, replace_symlinks, run_chunked, unique_targets
 
 BASE_DIR = Path("/home/marco/Repos/cyclomedia/detekt-product/detekt-test/mockup_data/track_2020")
 METADATA_FILE = BASE_DIR / "data" / "image_metadata.json"
@@ -19,10 +20,11 @@ def recreate_symlinks():
     
     # Load metadata
     print(f"\n📄 Loading metadata from: {METADATA_FILE}")
-    with open(METADATA_FILE, 'r') as f:
-        metadata = json.load(f)
+    with open(METADATA_FILE, 'rb') as f:
+        # total_images precedes image_positions, so this stops early
+        total_images = next(ijson.items(f, 'total_images'))
     
-    print(f"✓ Loaded {metadata['total_images']} image positions")
+    print(f"✓ Found {total_images} image positions")
     
     # Get reference images
     reference_images = sorted(REFERENCE_DIR.glob("frame*.png"))
@@ -39,40 +41,39 @@ def recreate_symlinks():
     print(f"\n📁 Target directory: {SPHERICAL_DIR}")
     
     # Create symlinks
-    print(f"\n🔗 Creating {metadata['total_images']} symlinks...")
-    created = 0
+    print(f"\n🔗 Creating {total_images} symlinks...")
     
-    for position in metadata['image_positions']:
-        # Target path (e.g., data/images/spherical/0.jpg)
-        target_filename = position['image_path'].split('/')[-1]  # Get just the filename
-        target_path = SPHERICAL_DIR / target_filename
-        
-        # Cycle through reference images
-        source_img = reference_images[position['id'] % len(reference_images)]
-        
-        # Create relative symlink
-        # From: data/images/spherical/0.jpg
-        # To: resources/reference_images/frame1.png
-        # Relative: ../../../resources/reference_images/frame1.png
-        relative_source = os.path.relpath(source_img, target_path.parent)
-        
-        # Remove if exists
-        if target_path.exists() or target_path.is_symlink():
-            target_path.unlink()
-        
-        # Create symlink
-        os.symlink(relative_source, target_path)
-        created += 1
-        
-        if created % 5000 == 0:
-            print(f"  Progress: {created}/{metadata['total_images']}...")
+    # Relative symlink sources, one per reference image
+    # From: data/images/spherical/0.jpg
+    # To: resources/reference_images/frame1.png
+    # Relative: ../../../resources/reference_images/frame1.png
+    relative_sources = [os.path.relpath(img, SPHERICAL_DIR) for img in reference_images]
+    
+    # Stream the positions; only (source, filename) pairs are kept
+    tasks = []
+    with open(METADATA_FILE, 'rb') as f:
+        for position in ijson.items(f, 'image_positions.item'):
+            # Target filename inside data/images/spherical (e.g., 0.jpg)
+            target_filename = position['image_path'].rsplit('/', 1)[-1]  # Get just the filename
+            
+            # Cycle through reference images
+            tasks.append((relative_sources[position['id'] % len(relative_sources)], target_filename))
+    
+    # A filename listed twice keeps its last source, as a sequential pass would
+    tasks = unique_targets(tasks)
+    
+    # Open the target directory once; all workers create links relative to it
+    dirfd = open_dir(SPHERICAL_DIR)
+    try:
+        created = run_chunked(lambda chunk: replace_symlinks(chunk, dirfd), tasks, len(tasks))
+    finally:
+        close_dir(dirfd)
     
     print(f"\n✅ Created {created} symlinks!")
     
     # Verify a few symlinks
     print(f"\n🔍 Verifying symlinks...")
-    for i in range(min(5, len(metadata['image_positions']))):
-        target_filename = metadata['image_positions'][i]['image_path'].split('/')[-1]
+    for _, target_filename in tasks[:5]:
         link_path = SPHERICAL_DIR / target_filename
         if link_path.is_symlink():
             target = os.readlink(link_path)
@@ -4,9 +4,20 @@ Reorganize mockup data folder structure
 from pathlib import Path
 import shutil
 import os
+from symlink_utils import close_dir, open_dir, replace_symlink, run_chunked, unique_targets, unlink
 
 BASE_DIR = Path("/home/marco/Repos/cyclomedia/detekt-product/detekt-test/mockup_data/track_2020")
 
+def _move_link_chunk(chunk, old_dirfd, new_dirfd):
+    """Drop one chunk of old links and recreate them in the new dir; returns how many were made"""
+    for relative_source, name in chunk:
+        # Remove old symlink
+        unlink(name, old_dirfd)
+        
+        # Create new symlink with relative path
+        replace_symlink(relative_source, name, new_dirfd)
+    return len(chunk)
+
 def reorganize_structure():
     """Reorganize folder structure to separate resources from generated data"""
     
@@ -72,29 +83,28 @@ def reorganize_structure():
         print("  ❌ No reference images found!")
         return
     
-    # Recreate symlinks
+    # Recreate symlinks, working on filenames relative to directories opened once
     created = 0
-    for old_link in old_symlinks:
-        # Get the ID from filename (e.g., "0.jpg" -> 0)
-        file_id = int(old_link.stem)
-        
-        # Determine which reference image to use (cycle through)
-        source_img = reference_images[file_id % len(reference_images)]
-        
-        # New symlink path
-        new_link = data_spherical_dir / old_link.name
-        
-        # Remove old symlink
-        if old_link.exists() or old_link.is_symlink():
-            old_link.unlink()
-        
-        # Create new symlink with relative path
-        relative_source = os.path.relpath(source_img, new_link.parent)
-        os.symlink(relative_source, new_link)
-        created += 1
-        
-        if created % 5000 == 0:
-            print(f"  Progress: {created}/{len(old_symlinks)}...")
+    if old_symlinks:
+        old_dirfd = open_dir(old_spherical_dir)
+        new_dirfd = open_dir(data_spherical_dir)
+        try:
+            # Relative symlink sources, one per reference image
+            relative_sources = [os.path.relpath(img, data_spherical_dir) for img in reference_images]
+            
+            tasks = []
+            for old_link in old_symlinks:
+                # Get the ID from filename (e.g., "0.jpg" -> 0)
+                file_id = int(old_link.stem)
+                
+                # Determine which reference image to use (cycle through)
+                tasks.append((relative_sources[file_id % len(relative_sources)], old_link.name))
+            tasks = unique_targets(tasks)
+            
+            created = run_chunked(lambda chunk: _move_link_chunk(chunk, old_dirfd, new_dirfd), tasks, len(tasks))
+        finally:
+            close_dir(old_dirfd)
+            close_dir(new_dirfd)
     
     print(f"  ✓ Recreated {created} symlinks")
     
@@ -0,0 +1,94 @@
+"""
+Shared helpers for the scripts that create the spherical image symlinks
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LINK_CHUNK_SIZE = 1024  # Links per executor task, so the pool isn't paying a future per link
+PROGRESS_EVERY = 5000
+
+# Working on filenames relative to a directory fd opened once (symlinkat/unlinkat/renameat)
+# skips the per-link path walk. That is POSIX-only: without O_DIRECTORY/dir_fd (e.g. on
+# Windows) open_dir returns the path and links are made by full path instead
+_HAS_DIR_FD = hasattr(os, "O_DIRECTORY") and {os.symlink, os.unlink, os.rename} <= os.supports_dir_fd
+
+
+def open_dir(path):
+    """Open a directory for the link calls below: its fd on POSIX, else the path itself"""
+    if _HAS_DIR_FD:
+        return os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    return os.fspath(path)
+
+
+def close_dir(dirfd):
+    """Flush the directory entries once (not per link) and close it"""
+    if isinstance(dirfd, int):
+        os.fsync(dirfd)
+        os.close(dirfd)
+
+
+def _at(name, dirfd):
+    """(path, dir_fd) arguments for `name` inside a directory from open_dir"""
+    if isinstance(dirfd, int):
+        return name, dirfd
+    return os.path.join(dirfd, name), None
+
+
+def replace_symlink(relative_source, name, dirfd):
+    """Point `name` at `relative_source`, replacing an existing entry atomically"""
+    path, fd = _at(name, dirfd)
+    try:
+        os.symlink(relative_source, path, dir_fd=fd)
+    except FileExistsError:
+        # Link under a temporary name and rename it over the old entry, so the name never goes missing
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        os.symlink(relative_source, tmp, dir_fd=fd)
+        os.replace(tmp, path, src_dir_fd=fd, dst_dir_fd=fd)
+
+
+def unlink(name, dirfd):
+    """Remove `name` if it exists"""
+    path, fd = _at(name, dirfd)
+    try:
+        os.unlink(path, dir_fd=fd)
+    except FileNotFoundError:
+        pass
+
+
+def replace_symlinks(chunk, dirfd):
+    """Create one chunk of (relative source, filename) links; returns how many were made"""
+    for relative_source, name in chunk:
+        replace_symlink(relative_source, name, dirfd)
+    return len(chunk)
+
+
+def create_symlinks(chunk):
+    """Create one chunk of (relative source, target path) links, skipping existing targets; returns how many were made"""
+    created = 0
+    for relative_source, target_path in chunk:
+        try:
+            os.symlink(relative_source, target_path)
+            created += 1
+        except FileExistsError:
+            pass
+    return created
+
+
+def unique_targets(tasks):
+    """Keep only the last (source, target) pair per target, so no two workers touch the same name"""
+    return [(source, target) for target, source in {target: source for source, target in tasks}.items()]
+
+
+def run_chunked(link_chunk, tasks, total):
+    """Run `link_chunk` over LINK_CHUNK_SIZE slices of `tasks` on a thread pool (each link
+    syscall releases the GIL), printing progress; returns the sum of its per-chunk counts"""
+    chunks = [tasks[i:i + LINK_CHUNK_SIZE] for i in range(0, len(tasks), LINK_CHUNK_SIZE)]
+    made = done = 0
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        for chunk, count in zip(chunks, executor.map(link_chunk, chunks)):
+            made += count
+            done += len(chunk)
+            if done // PROGRESS_EVERY != (done - len(chunk)) // PROGRESS_EVERY:
+                print(f"  Progress: {done}/{total}...")
+    return made
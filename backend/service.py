@@ -1,8 +1,20 @@
-import json
+import gzip
+import ijson
+import logging
+import mmap
+import orjson
+import os
+import pickle
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from models.domain import Feature, ImagePosition, Campaign
+from typing import Callable, Optional, Dict, Any, List, Tuple
+from models.domain import Feature, ImagePosition, Campaign, FeatureColumns, ImageColumns, pack_points, pack_timestamps
+
+logger = logging.getLogger(__name__)
 
 
 class MappingService:
@@ -10,124 +22,310 @@ class MappingService:
     MOCKUP_BASE: Path = Path(__file__).parent.parent / "mockup_data" / "track_2020" / "data"
     IMAGE_METADATA: Path = MOCKUP_BASE / "image_metadata.json"
     FEATURES_DIR: Path = MOCKUP_BASE / "features"
+    # Parsed Campaign persisted across process restarts, next to the data it was built from;
+    # bump the version when the models change
+    CAMPAIGN_CACHE: Path = MOCKUP_BASE / ".campaign_cache.pkl"
+    CAMPAIGN_CACHE_VERSION: int = 10
     
-    _cached_campaign: Optional[Campaign] = None
+    _cache: Optional["_CampaignCache"] = None  # Replaced by a fresh entry on reload
+    _reload_lock = threading.RLock()  # One reload at a time; re-entrant so reload hooks can call back in
+    _reload_hooks: List[Callable[[], None]] = []
     
     @staticmethod
     def load_real_campaign() -> Campaign:
         
-        print(f"📦 Loading campaign data from: {MappingService.MOCKUP_BASE}")
-        
-        print(f"  Loading images from: {MappingService.IMAGE_METADATA}")
-        with open(MappingService.IMAGE_METADATA, 'r') as f:
-            image_data: Dict[str, Any] = json.load(f)
+        logger.info(f"📦 Loading campaign data from: {MappingService.MOCKUP_BASE}")
         
-        images: List[ImagePosition] = []
-        for img_pos in image_data['image_positions'][::100]:
-            images.append(ImagePosition(
-                id=img_pos['id'],
-                timestamp=datetime.fromisoformat(img_pos['timestamp']),
-                camera_id=img_pos['camera_name'],
-                geometry={
-                    "type": "Point",
-                    "coordinates": [img_pos['longitude'], img_pos['latitude']]
-                },
-                heading=0.0,
-                feature_ids=img_pos.get('visible_in_images', [])
-            ))
+        logger.info(f"  Loading images from: {MappingService.IMAGE_METADATA}")
+        with open(MappingService.IMAGE_METADATA, 'rb') as f:
+            # The campaign header precedes image_positions, so this stops early
+            campaign_info: Optional[Dict[str, Any]] = next(ijson.items(f, 'campaign'), None)
+            if campaign_info is None:
+                raise KeyError(f"No 'campaign' header in {MappingService.IMAGE_METADATA}")
+            
+            # Stream the positions and only build the 1-in-100 we keep. The lists are
+            # sized by what is actually streamed, not by the header's total_images
+            f.seek(0)
+            positions = ijson.items(f, 'image_positions.item', use_float=True)
+            images: List[ImagePosition] = []
+            image_coords: List[tuple] = []
+            image_timestamps: List[str] = []
+            total_images: int = 0
+            for total_images, img_pos in enumerate(positions, 1):
+                if (total_images - 1) % 100:
+                    continue
+                images.append(ImagePosition(
+                    id=img_pos['id'],
+                    camera_id=sys.intern(img_pos['camera_name']),
+                    heading=0.0,
+                    feature_ids=img_pos.get('visible_in_images', [])
+                ))
+                image_coords.append((img_pos['longitude'], img_pos['latitude']))
+                image_timestamps.append(img_pos['timestamp'])
         
-        print(f"  ✓ Loaded {len(images)} image positions (subsampled from {len(image_data['image_positions'])})")
+        logger.info(f"  ✓ Loaded {len(images)} image positions (subsampled from {total_images})")
         
         features: List[Feature] = []
+        feature_coords: List[List[float]] = []
         
-        horizontal_dir: Path = MappingService.FEATURES_DIR / "horizontal"
-        if horizontal_dir.exists():
-            for feature_file in horizontal_dir.glob("*.json"):
-                if feature_file.name == "features_summary.json":
-                    continue
-                
-                with open(feature_file, 'r') as f:
-                    feature_data: Dict[str, Any] = json.load(f)
-                
-                for feat in feature_data['features']:
-                    feature_type: str = feat['feature_type']
-                    condition: str = _map_condition(feat)
-                    
-                    features.append(Feature(
-                        id=feat['id'],
-                        type=feature_type,
-                        condition=condition,
-                        confidence=feat.get('confidence', 0.85),
-                        geometry=feat['geometry'],
-                        attributes=feat.get('attributes', {}),
-                        image_ids=feat.get('visible_in_images', [])
-                    ))
-                
-                print(f"  ✓ Loaded {len(feature_data['features'])} {feature_data['feature_type']} features")
-        
-        vertical_dir: Path = MappingService.FEATURES_DIR / "vertical"
-        if vertical_dir.exists():
-            for feature_file in vertical_dir.glob("*.json"):
-                if feature_file.name == "features_summary.json":
-                    continue
-                
-                with open(feature_file, 'r') as f:
-                    feature_data: Dict[str, Any] = json.load(f)
-                
-                for feat in feature_data['features']:
-                    feature_type: str = feat['feature_type']
-                    condition: str = _map_condition(feat)
-                    
-                    features.append(Feature(
-                        id=feat['id'],
-                        type=feature_type,
-                        condition=condition,
-                        confidence=feat.get('confidence', 0.85),
-                        geometry=feat['geometry'],
-                        attributes=feat.get('attributes', {}),
-                        image_ids=feat.get('visible_in_images', [])
-                    ))
-                
-                print(f"  ✓ Loaded {len(feature_data['features'])} {feature_data['feature_type']} features")
+        # Both feature directories (horizontal first), read + parsed on a thread pool
+        # so the reads overlap; Features are built here, in file order
+        feature_files: List[Path] = [
+            *_feature_files(MappingService.FEATURES_DIR / "horizontal"),
+            *_feature_files(MappingService.FEATURES_DIR / "vertical"),
+        ]
+        counts: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=min(8, len(feature_files) or 1)) as executor:
+            for feature_data in executor.map(_read_json, feature_files):
+                _ingest_feature_file(feature_data, features, feature_coords)
+                counts[feature_data['feature_type']] = counts.get(feature_data['feature_type'], 0) + len(feature_data['features'])
         
-        print(f"  ✓ Total features loaded: {len(features)}")
+        # One summary record instead of one per file
+        logger.info("\n".join([f"  ✓ Loaded {n} {t} features" for t, n in counts.items()]
+                              + [f"  ✓ Total features loaded: {len(features)}"]))
         
         campaign: Campaign = Campaign(
-            id=image_data['campaign']['id'],
-            name=image_data['campaign']['name'],
+            id=campaign_info['id'],
+            name=campaign_info['name'],
             features=features,
-            images=images
+            images=images,
+            features_xyz=pack_points(features, feature_coords, 3),
+            images_xy=pack_points(images, image_coords, 2),
+            image_timestamps=pack_timestamps(images, image_timestamps)
         )
         
-        print(f"✅ Campaign loaded: {campaign.name}")
-        print(f"   - {campaign.total_features} features")
-        print(f"   - {campaign.total_images} image positions")
+        logger.info(f"✅ Campaign loaded: {campaign.name}\n"
+                    f"   - {campaign.total_features} features\n"
+                    f"   - {campaign.total_images} image positions")
         
         return campaign
     
+    @staticmethod
+    def _campaign_cache_key() -> tuple:
+        sources: List[Path] = [MappingService.IMAGE_METADATA]
+        for subdir in ("horizontal", "vertical"):
+            sources.extend(sorted(_feature_files(MappingService.FEATURES_DIR / subdir)))
+        return (
+            MappingService.CAMPAIGN_CACHE_VERSION,
+            tuple((str(path), path.stat().st_mtime_ns) for path in sources),
+        )
+    
+    @staticmethod
+    def load_cached_campaign(key: Optional[tuple] = None) -> Campaign:
+        """Load the campaign from the on-disk pickle if its source files are unchanged"""
+        key = key or MappingService._campaign_cache_key()
+        cache: Path = MappingService.CAMPAIGN_CACHE
+        try:
+            with open(cache, 'rb') as f:
+                # The key is pickled ahead of the campaign, so a stale cache is rejected
+                # before any (possibly incompatible) model objects are unpickled
+                if pickle.load(f) == key:
+                    campaign = pickle.load(f)
+                    logger.info(f"📦 Loaded cached campaign from: {cache}")
+                    return campaign
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Anything from a truncated file to classes that moved since it was written: rebuild
+            logger.warning(f"⚠️  Discarding unreadable campaign cache {cache}: {e!r}")
+            try:
+                cache.unlink()
+            except OSError:
+                pass
+        
+        campaign = MappingService.load_real_campaign()
+        
+        # Write to a temp file and rename so a concurrent reader never sees a partial pickle
+        tmp: Path = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(key, f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(campaign, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not write campaign cache: {e}")
+        return campaign
+    
+    @staticmethod
+    def _refresh() -> "_CampaignCache":
+        """The current cache entry, reloaded first if the source files changed"""
+        # A few stat() calls per call: edited mockup data is picked up without a restart
+        key: tuple = MappingService._campaign_cache_key()
+        cache: Optional[_CampaignCache] = MappingService._cache
+        if cache is not None and cache.key == key:
+            return cache
+        
+        with MappingService._reload_lock:
+            cache = MappingService._cache
+            if cache is not None and cache.key == key:  # Another thread reloaded while we waited
+                return cache
+            reloading: bool = cache is not None
+            generation: int = cache.generation + 1 if cache is not None else 0
+            cache = _CampaignCache(key, generation, MappingService.load_cached_campaign(key))
+            # Readers see either the old entry or the new one, never a mix of their views
+            MappingService._cache = cache
+            if reloading:
+                for hook in MappingService._reload_hooks:
+                    hook()
+        return cache
+    
+    @staticmethod
+    def _current() -> "_CampaignCache":
+        """The current cache entry without re-checking the sources (for hot paths)"""
+        cache: Optional[_CampaignCache] = MappingService._cache
+        return cache if cache is not None else MappingService._refresh()
+    
     @staticmethod
     def get_campaign() -> Campaign:
-        if MappingService._cached_campaign is None:
-            MappingService._cached_campaign = MappingService.load_real_campaign()
-        return MappingService._cached_campaign
+        return MappingService._refresh().campaign
+    
+    @staticmethod
+    def on_reload(hook: Callable[[], None]) -> Callable[[], None]:
+        """Register a callback for state derived from a campaign that has just been replaced"""
+        MappingService._reload_hooks.append(hook)
+        return hook
+    
+    @staticmethod
+    def get_campaign_json() -> bytes:
+        # Goes through _refresh() first so a frontend reload sees edited data
+        return MappingService._campaign_json(MappingService._refresh())
+    
+    @staticmethod
+    def get_campaign_json_gzip() -> bytes:
+        cache: _CampaignCache = MappingService._refresh()
+        if cache.json_gzip is None:
+            cache.json_gzip = gzip.compress(MappingService._campaign_json(cache))
+        return cache.json_gzip
+    
+    @staticmethod
+    def _campaign_json(cache: "_CampaignCache") -> bytes:
+        if cache.json is None:
+            cache.json = cache.campaign.model_dump_json().encode()
+        return cache.json
+    
+    @staticmethod
+    def get_campaign_and_feature_columns() -> Tuple[Campaign, FeatureColumns]:
+        """The campaign and its feature columns, taken from the same load"""
+        cache: _CampaignCache = MappingService._refresh()
+        return cache.campaign, MappingService._feature_columns(cache)
+    
+    @staticmethod
+    def get_columns() -> Tuple[int, ImageColumns, FeatureColumns]:
+        """Generation, image columns and feature columns, all taken from the same load"""
+        cache: _CampaignCache = MappingService._current()
+        return cache.generation, MappingService._image_columns(cache), MappingService._feature_columns(cache)
+    
+    @staticmethod
+    def _feature_columns(cache: "_CampaignCache") -> FeatureColumns:
+        if cache.feature_columns is None:
+            cache.feature_columns = FeatureColumns.from_campaign(cache.campaign)
+        return cache.feature_columns
+    
+    @staticmethod
+    def get_image_columns() -> ImageColumns:
+        return MappingService._image_columns(MappingService._current())
+    
+    @staticmethod
+    def _image_columns(cache: "_CampaignCache") -> ImageColumns:
+        if cache.image_columns is None:
+            cache.image_columns = ImageColumns.from_campaign(cache.campaign)
+        return cache.image_columns
+
+
+@dataclass(slots=True)
+class _CampaignCache:
+    """A loaded campaign and the views derived from it (filled lazily).
+    
+    Each reload builds a new entry, so a view is always built from, and stored
+    next to, the campaign it belongs to.
+    """
+    key: tuple  # _campaign_cache_key() the campaign was built from
+    generation: int
+    campaign: Campaign
+    json: Optional[bytes] = None
+    json_gzip: Optional[bytes] = None
+    feature_columns: Optional[FeatureColumns] = None
+    image_columns: Optional[ImageColumns] = None
+
+_ABSENT = object()  # Marks a missing attribute in _map_condition_key's cache key
+
+# Shared condition strings, so every Feature references one object per condition
+_COND_GOOD: str = sys.intern("good")
+_COND_FAIR: str = sys.intern("fair")
+_COND_POOR: str = sys.intern("poor")
+_COND_DAMAGED: str = sys.intern("damaged")
+_CONDITIONS: Dict[str, str] = {c: c for c in (_COND_GOOD, _COND_FAIR, _COND_POOR, _COND_DAMAGED)}
+
+
+_MMAP_MIN_SIZE = 1 << 20  # Files above this are parsed from a mapping rather than a read() copy
+
+
+def _feature_files(directory: Path) -> Tuple[Path, ...]:
+    """The feature JSON files in a directory, re-listed only when the directory changes"""
+    try:
+        mtime_ns: int = directory.stat().st_mtime_ns
+    except FileNotFoundError:
+        return ()
+    return _list_jsons(str(directory), mtime_ns)
+
+
+@lru_cache(maxsize=16)
+def _list_jsons(dir_str: str, mtime_ns: int) -> Tuple[Path, ...]:
+    # mtime_ns only keys the cache: adding, removing or renaming a file bumps the directory's mtime
+    return tuple(p for p in Path(dir_str).glob("*.json") if p.name != "features_summary.json")
+
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size <= _MMAP_MIN_SIZE:
+            return orjson.loads(f.read())
+        # orjson parses the page-cache-backed view directly, skipping the file-sized bytes copy
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            return orjson.loads(view)
+
+
+def _ingest_feature_file(feature_data: Dict[str, Any], features: List[Feature], feature_coords: List[List[float]]) -> None:
+    # Grow the output lists once per file, then fill by index
+    start: int = len(features)
+    features.extend([None] * len(feature_data['features']))
+    feature_coords.extend([None] * len(feature_data['features']))
+    for i, feat in enumerate(feature_data['features'], start):
+        feature_type: str = sys.intern(feat['feature_type'])
+        condition: str = _map_condition(feat)
+        
+        features[i] = Feature(
+            id=feat['id'],
+            type=feature_type,
+            condition=condition,
+            confidence=feat.get('confidence', 0.85),
+            attributes=feat.get('attributes', {}),
+            image_ids=feat.get('visible_in_images', [])
+        )
+        feature_coords[i] = feat['geometry']['coordinates']
 
 
 def _map_condition(feature: Dict[str, Any]) -> str:
+    # Reduce the feature to the few values the mapping depends on, so the
+    # branching runs once per distinct combination
     attributes: Dict[str, Any] = feature.get('attributes', {})
+    condition: Optional[str] = attributes['condition'].lower() if 'condition' in attributes else None
+    severity: Any = attributes.get('severity', _ABSENT)
+    if severity is not _ABSENT and not isinstance(severity, str):
+        # Only severity names map to a condition; any other value (a number, or an
+        # unhashable list/dict the cache can't take) maps like an unknown name
+        severity = None
+    confidence: float = feature.get('confidence', 0.9)
+    confidence_bucket: int = 2 if confidence > 0.95 else 1 if confidence > 0.85 else 0
+    return _map_condition_key(condition, severity, confidence_bucket)
+
+
+@lru_cache(maxsize=None)
+def _map_condition_key(condition: Optional[str], severity: Any, confidence_bucket: int) -> str:
+    if condition in _CONDITIONS:
+        return _CONDITIONS[condition]
     
-    if 'condition' in attributes:
-        cond: str = attributes['condition'].lower()
-        if cond in ['good', 'fair', 'poor', 'damaged']:
-            return cond
-    
-    if 'severity' in attributes:
-        severity_map: Dict[str, str] = {"minor": "fair", "moderate": "poor", "severe": "damaged"}
-        return severity_map.get(attributes['severity'], "fair")
+    if severity is not _ABSENT:
+        severity_map: Dict[str, str] = {"minor": _COND_FAIR, "moderate": _COND_POOR, "severe": _COND_DAMAGED}
+        return severity_map.get(severity, _COND_FAIR)
     
-    confidence: float = feature.get('confidence', 0.9)
-    if confidence > 0.95:
-        return "good"
-    elif confidence > 0.85:
-        return "fair"
-    else:
-        return "poor"
+    return (_COND_POOR, _COND_FAIR, _COND_GOOD)[confidence_bucket]
@@ -3,6 +3,7 @@ Test script to validate the agent's tool usage
 """
 import os
 import json
+import asyncio
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -12,14 +13,15 @@ load_dotenv(dotenv_path=env_path)
 
 from agent_service import MappingAgent
 
-def test_question(agent: MappingAgent, question: str):
+async def test_question(agent: MappingAgent, question: str):
     """Test a question and print results"""
     print(f"\n{'='*80}")
     print(f"QUESTION: {question}")
     print('='*80)
+    result = None
     
     try:
-        result = agent.ask(question)
+        result = await agent.ask(question)
         
         print(f"\n✓ ANSWER: {result['answer']}")
         print(f"\n🔧 TOOLS USED ({len(result['tool_uses'])}):")
@@ -68,11 +70,18 @@ def main():
         "which image has the most damaged features?",
     ]
     
-    for question in test_cases:
-        # Create fresh agent for each question to avoid context pollution
-        agent = MappingAgent(api_key)
-        print(f"\nCampaign: {agent.campaign.total_features} features, {agent.campaign.total_images} images")
-        test_question(agent, question)
+    # One agent (and HTTP client) for the whole run; its history is cleared
+    # between questions to avoid context pollution
+    agent = MappingAgent(api_key)
+    print(f"\nCampaign: {agent.campaign.total_features} features, {agent.campaign.total_images} images")
+    
+    async def run_all():
+        for question in test_cases:
+            agent.clear_history()
+            await test_question(agent, question)
+    
+    # A single event loop: the agent's async client can't move between loops
+    asyncio.run(run_all())
     
     print("\n" + "="*80)
     print("TESTING COMPLETE")
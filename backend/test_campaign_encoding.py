@@ -0,0 +1,37 @@
+"""
+Test that /campaign honours Accept-Encoding q-values
+"""
+from dotenv import load_dotenv
+from pathlib import Path
+
+# Load environment
+env_path = Path(__file__).parent.parent / '.env'
+load_dotenv(dotenv_path=env_path)
+
+from fastapi.testclient import TestClient
+from main import app
+
+def test_campaign_encoding():
+    """gzip only when the client accepts it; "gzip;q=0" must get the identity body"""
+    cases = [
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0.5, br", "gzip"),
+        ("*", "gzip"),
+        ("gzip;q=0", None),
+        ("gzip;q=0, *", None),
+        ("*;q=0", None),
+        ("identity", None),
+    ]
+    with TestClient(app) as client:
+        for accept_encoding, expected in cases:
+            response = client.get("/campaign", headers={"Accept-Encoding": accept_encoding})
+            encoding = response.headers.get("content-encoding")
+            print(f"  {accept_encoding!r:20} -> {encoding or 'identity'}")
+            assert response.status_code == 200
+            assert encoding == expected, f"{accept_encoding!r}: expected {expected}, got {encoding}"
+            assert response.json()["features"] is not None
+
+
+if __name__ == "__main__":
+    test_campaign_encoding()
+    print("\n✅ /campaign encoding OK")